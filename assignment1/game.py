@@ -1,6 +1,6 @@
 from util import *
 from util import raiseNotDefined
-import time, os
+import time, os, random
 import traceback
 
 try:
@@ -59,6 +59,7 @@ class Configuration:
   The convention for positions, like a graph, is that (0,0) is the lower left corner, x increases
   horizontally and y increases vertically.  Therefore, north is the direction of increasing y, or (0,1).
   """
+  __slots__ = ('pos', 'direction')
 
   def __init__(self, pos, direction):
     self.pos = pos
@@ -104,7 +105,12 @@ class Configuration:
 class AgentState:
   """
   AgentStates hold the state of an agent (configuration, speed, scared, etc).
+
+  Successor states share the AgentStates of agents that did not change, so
+  an AgentState reachable from a GameStateData must not be modified in
+  place; use GameStateData.mutableAgentState to get a private copy.
   """
+  __slots__ = ('start', 'configuration', 'isPacman', 'scaredTimer')
 
   def __init__( self, startConfiguration, isPacman ):
     self.start = startConfiguration
@@ -226,7 +232,7 @@ class Grid:
     return tuple(bits)
 
   def _cellIndexToPosition(self, index):
-    x = index / self.height
+    x = index // self.height
     y = index % self.height
     return x, y
 
@@ -254,6 +260,134 @@ class Grid:
         bools.append(False)
     return bools
 
+try:
+  _popcount = int.bit_count
+except AttributeError: # Python < 3.10
+  _popcount = lambda n: bin(n).count('1')
+
+class BitGrid:
+  """
+  A drop-in replacement for a boolean Grid that stores the whole board as the
+  bits of a single Python int, cell (x,y) being bit x * height + y.  Counting
+  is a popcount, asList only visits set bits, and copying shares the
+  (immutable) int, so a copy costs O(1) until one of the copies is written.
+
+  Data is still accessed via grid[x][y]; grid[x] returns a light view of
+  column x that reads and writes the underlying bits.
+  """
+  def __init__(self, width, height, initialValue=False, bits=0):
+    if initialValue not in [False, True]: raise Exception('Grids can only contain booleans')
+    self.width = width
+    self.height = height
+    if initialValue:
+      bits = (1 << (width * height)) - 1
+    self.bits = bits
+
+  def __getitem__(self, x):
+    if not 0 <= x < self.width: raise IndexError('BitGrid column out of range')
+    return BitGridColumn(self, x * self.height)
+
+  def __iter__(self):
+    for x in range(self.width):
+      yield self[x]
+
+  def isSet(self, x, y):
+    return (self.bits >> (x * self.height + y)) & 1 == 1
+
+  def setCell(self, x, y, value):
+    bit = 1 << (x * self.height + y)
+    if value:
+      self.bits |= bit
+    else:
+      self.bits &= ~bit
+
+  def __str__(self):
+    out = [[str(self.isSet(x, y))[0] for x in range(self.width)] for y in range(self.height)]
+    out.reverse()
+    return '\n'.join([''.join(x) for x in out])
+
+  def __eq__(self, other):
+    if other == None: return False
+    if isinstance(other, BitGrid):
+      return self.bits == other.bits and self.width == other.width and self.height == other.height
+    return self.data == other.data
+
+  def __hash__(self):
+    return hash(self.bits)
+
+  @property
+  def data(self):
+    "The board as a list of lists, for code written against Grid"
+    return [[self.isSet(x, y) for y in range(self.height)] for x in range(self.width)]
+
+  def copy(self):
+    return BitGrid(self.width, self.height, bits=self.bits)
+
+  def deepCopy(self):
+    return self.copy()
+
+  def shallowCopy(self):
+    return self.copy()
+
+  def count(self, item =True ):
+    ones = _popcount(self.bits)
+    if item == True: return ones
+    if item == False: return self.width * self.height - ones
+    return 0
+
+  def asList(self, key = True):
+    if key != True:
+      return [(x, y) for x in range(self.width) for y in range(self.height) if self.isSet(x, y) == key]
+    list = []
+    bits = self.bits
+    height = self.height
+    while bits:
+      low = bits & -bits
+      index = low.bit_length() - 1
+      list.append( (index // height, index % height) )
+      bits ^= low
+    return list
+
+  def packBits(self):
+    """
+    Returns an efficient int list representation
+
+    (width, height, bitPackedInts...), in the same format as Grid.packBits
+    """
+    CELLS_PER_INT = 30
+    bits = [self.width, self.height]
+    # One chunk per CELLS_PER_INT cells plus a last, partial (possibly empty) one
+    for start in range(0, self.width * self.height + 1, CELLS_PER_INT):
+      chunk = (self.bits >> start) & ((1 << CELLS_PER_INT) - 1)
+      # Grid puts the first cell of each chunk in its most significant bit
+      bits.append(int(format(chunk, '0%db' % CELLS_PER_INT)[::-1], 2))
+    return tuple(bits)
+
+class BitGridColumn:
+  """
+  A view of one column of a BitGrid, indexed by y.
+  """
+  __slots__ = ('grid', 'offset')
+
+  def __init__(self, grid, offset):
+    self.grid = grid
+    self.offset = offset
+
+  def __getitem__(self, y):
+    if not 0 <= y < self.grid.height: raise IndexError('BitGrid row out of range')
+    return (self.grid.bits >> (self.offset + y)) & 1 == 1
+
+  def __setitem__(self, y, value):
+    if not 0 <= y < self.grid.height: raise IndexError('BitGrid row out of range')
+    bit = 1 << (self.offset + y)
+    if value:
+      self.grid.bits |= bit
+    else:
+      self.grid.bits &= ~bit
+
+  def __len__(self):
+    return self.grid.height
+
 def reconstituteGrid(bitRep):
   if type(bitRep) is not type((1,2)):
     return bitRep
@@ -348,6 +482,81 @@ class Actions:
     return (x + dx, y + dy)
   getSuccessor = staticmethod(getSuccessor)
 
+class ZobristTable:
+  """
+  Assigns a random 64-bit key to every feature of a game state (an agent's
+  configuration and scared timer, a food pellet, a capsule, the score).  A state's key
+  is the XOR of the keys of its features, so it can be updated in O(1)
+  when a single feature changes.  A feature's key is a splitmix64 mix of
+  its fields alone, so every process agrees on it (states can be pickled
+  to search workers) and the game's own random stream is left untouched.
+  Positions and scores enter the mix as fixed-point numbers with 1/1024
+  resolution, which is exact for the half steps of scared ghosts.
+
+  The keys of agents, food and capsules are cached, as there are only so
+  many of them on a board.  Scores are not bounded, so their cache is
+  emptied whenever it reaches MAX_SCORE_KEYS entries.
+  """
+  MAX_SCORE_KEYS = 4096
+  MASK = (1 << 64) - 1
+  AGENT, FOOD, CAPSULE, SCORE = range(1, 5)
+  DIRECTIONS = {Directions.NORTH: 1, Directions.SOUTH: 2, Directions.EAST: 3,
+                Directions.WEST: 4, Directions.STOP: 5}
+
+  def __init__(self, seed=0):
+    self.seed = seed
+    self.keys = {}
+    self.scoreKeys = {}
+
+  def mix(self, *fields):
+    "splitmix64 of the seed followed by each field in turn"
+    MASK = self.MASK
+    key = self.seed & MASK
+    for field in fields:
+      key = (key ^ field ^ 0x9E3779B97F4A7C15) & MASK
+      key = ((key ^ (key >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+      key = ((key ^ (key >> 27)) * 0x94D049BB133111EB) & MASK
+      key ^= key >> 31
+    return key
+
+  def fixed(self, value):
+    return int(round(value * 1024)) & self.MASK
+
+  def agentKey(self, index, agentState):
+    conf = agentState.configuration
+    if conf == None: return 0
+    feature = (index, conf.pos, conf.direction, agentState.scaredTimer)
+    key = self.keys.get(feature)
+    if key is None:
+      x, y = conf.pos
+      key = self.keys[feature] = self.mix(self.AGENT, index, self.fixed(x), self.fixed(y),
+                                          self.DIRECTIONS.get(conf.direction, 0), agentState.scaredTimer)
+    return key
+
+  def foodKey(self, position):
+    return self.positionKey(self.FOOD, position)
+
+  def capsuleKey(self, position):
+    return self.positionKey(self.CAPSULE, position)
+
+  def positionKey(self, kind, position):
+    x, y = position
+    feature = (kind, x, y)
+    key = self.keys.get(feature)
+    if key is None:
+      key = self.keys[feature] = self.mix(kind, self.fixed(x), self.fixed(y))
+    return key
+
+  def scoreKey(self, score):
+    key = self.scoreKeys.get(score)
+    if key is None:
+      if len(self.scoreKeys) >= self.MAX_SCORE_KEYS:
+        self.scoreKeys.clear()
+      key = self.scoreKeys[score] = self.mix(self.SCORE, self.fixed(score))
+    return key
+
+ZOBRIST = ZobristTable()
+
 class GameStateData:
   """
 
@@ -359,19 +568,23 @@ class GameStateData:
     if prevState != None:
       self.food = prevState.food.shallowCopy()
       self.capsules = prevState.capsules[:]
-      self.agentStates = self.copyAgentStates( prevState.agentStates )
+      self.agentStates = prevState.agentStates[:] # shared until modified, see mutableAgentState
       self.layout = prevState.layout
       self._eaten = prevState._eaten
       self.score = prevState.score
+      self._hashKey = prevState._hashKey
+      self._agentKeys = prevState._agentKeys[:]
     self._foodEaten = None
     self._capsuleEaten = None
     self._agentMoved = None
     self._lose = False
     self._win = False
     self.scoreChange = 0
+    self._copiedAgents = [] # indices of the agentStates no longer shared with prevState
 
   def deepCopy( self ):
     state = GameStateData( self )
+    state.agentStates = self.copyAgentStates( self.agentStates )
     state.food = self.food.deepCopy()
     state.layout = self.layout.deepCopy()
     state._agentMoved = self._agentMoved
@@ -385,6 +598,20 @@ class GameStateData:
       copiedStates.append( agentState.copy() )
     return copiedStates
 
+  def mutableAgentState( self, index ):
+    """
+    Returns the AgentState of agent index for modification, first replacing
+    it with a copy if it is still shared with the predecessor state.
+    """
+    if index not in self._copiedAgents:
+      self.agentStates[index] = self.agentStates[index].copy()
+      self._copiedAgents.append(index)
+    return self.agentStates[index]
+
+  def changedAgents( self ):
+    "Returns the indices of the agents copied by mutableAgentState"
+    return self._copiedAgents
+
   def __eq__( self, other ):
     """
     Allows two states to be compared.
@@ -401,13 +628,53 @@ class GameStateData:
     """
     Allows states to be keys of dictionaries.
     """
-    for i, state in enumerate( self.agentStates ):
-      try:
-        int(hash(state))
-      except TypeError as e:
-        print(e)
-        #hash(state)
-    return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 113* hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575 )
+    return self.stateKey()
+
+  def stateKey( self ):
+    """
+    Returns the 64-bit Zobrist key of this state, covering the agent
+    configurations and scared timers, the remaining food and capsules, and
+    the score.  The key is maintained incrementally as successors are
+    generated, so this is O(1).
+    """
+    return self._hashKey ^ ZOBRIST.scoreKey(self.score)
+
+  def eatFood( self, position ):
+    "Removes the food at position, which must be present"
+    x, y = position
+    self.food = self.food.copy()
+    self.food[x][y] = False
+    self._hashKey ^= ZOBRIST.foodKey(position)
+
+  def eatCapsule( self, position ):
+    "Removes the capsule at position, which must be present"
+    self.capsules.remove(position)
+    self._hashKey ^= ZOBRIST.capsuleKey(position)
+
+  def rehashAgents( self, indices ):
+    """
+    Refreshes the key after the agents at indices have changed their
+    configuration or scared timer.
+    """
+    for index in indices:
+      key = ZOBRIST.agentKey(index, self.agentStates[index])
+      self._hashKey ^= self._agentKeys[index] ^ key
+      self._agentKeys[index] = key
+
+  def computeHashKey( self ):
+    """
+    Computes the Zobrist key from scratch.  Used on initialization, and
+    handy to check the incremental updates.
+    """
+    key = 0
+    agentKeys = [ZOBRIST.agentKey(i, s) for i, s in enumerate(self.agentStates)]
+    for agentKey in agentKeys:
+      key ^= agentKey
+    for position in self.food.asList():
+      key ^= ZOBRIST.foodKey(position)
+    for position in self.capsules:
+      key ^= ZOBRIST.capsuleKey(position)
+    return key, agentKeys
 
   def __str__( self ):
     width, height = self.layout.width, self.layout.height
@@ -479,6 +746,7 @@ class GameStateData:
         else: numGhosts += 1
       self.agentStates.append( AgentState( Configuration( pos, Directions.STOP), isPacman) )
     self._eaten = [False for a in self.agentStates]
+    self._hashKey, self._agentKeys = self.computeHashKey()
 
 class Game:
   """
@@ -649,7 +917,9 @@ class Game:
           self._agentCrash(agentIndex)
           return
       else:
+        start_time = time.time()
         action = agent.getAction(observation)
+        self.totalAgentTimes[agentIndex] += time.time() - start_time
       self.unmute()
 
       # Execute the action
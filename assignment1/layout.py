@@ -1,10 +1,16 @@
-from util import manhattanDistance
-from game import Grid
+from util import manhattanDistance, nearestPoint
+from game import Grid, BitGrid
+from array import array
 import os
 import random
+import hashlib
 from functools import reduce
 
 VISIBILITY_MATRIX_CACHE = {}
+LAYOUT_CACHE = {}
+MAZE_DISTANCE_CACHE = {}
+# Directory keeping computed maze distance tables between runs, None keeps them in memory only
+MAZE_DISTANCE_DIR = None
 
 class Layout:
   """
@@ -15,12 +21,13 @@ class Layout:
     self.width = len(layoutText[0])
     self.height= len(layoutText)
     self.walls = Grid(self.width, self.height, False)
-    self.food = Grid(self.width, self.height, False)
+    self.food = BitGrid(self.width, self.height, False)
     self.capsules = []
     self.agentPositions = []
     self.numGhosts = 0
     self.processLayoutText(layoutText)
     self.layoutText = layoutText
+    self.mazeDistances = None
     # self.initializeVisibilityMatrix()
     
   def getNumGhosts(self):
@@ -50,6 +57,24 @@ class Layout:
   def isWall(self, pos):
     x, col = pos
     return self.walls[x][col]
+
+  def getMazeDistances(self):
+    """
+    The MazeDistances of this board, computed the first time any copy of
+    the layout asks for them.
+    """
+    if self.mazeDistances is None:
+      key = "\n".join(self.layoutText)
+      if key not in MAZE_DISTANCE_CACHE:
+        MAZE_DISTANCE_CACHE[key] = MazeDistances.forLayout(self)
+      self.mazeDistances = MAZE_DISTANCE_CACHE[key]
+    return self.mazeDistances
+
+  def mazeDistance(self, pos1, pos2):
+    """
+    Length of the shortest path between two positions through the maze.
+    """
+    return self.getMazeDistances().distance(pos1, pos2)
   
   def getRandomLegalPosition(self):
     x = random.choice(list(range(self.width)))
@@ -77,6 +102,10 @@ class Layout:
     
   def deepCopy(self):
     return Layout(self.layoutText[:])
+
+  def __reduce__(self):
+    # A pickled layout is just its text; unpickling parses each board once per process
+    return (layoutFromText, (tuple(self.layoutText),))
     
   def processLayoutText(self, layoutText):
     """
@@ -114,6 +143,95 @@ class Layout:
     elif layoutChar in  ['1', '2', '3', '4']:
       self.agentPositions.append( (int(layoutChar), (x,y)))
       self.numGhosts += 1 
+
+class MazeDistances:
+  """
+  All-pairs shortest path lengths between the open cells of a board, from a
+  breadth-first search out of every cell.  Cells are numbered column by
+  column and the distances kept in one flat array of unsigned shorts, so
+  a lookup is two dict accesses and an index.
+  """
+  UNREACHABLE = 0xFFFF
+
+  def __init__(self, walls, distances = None):
+    self.cells = [(x, y) for x in range(walls.width) for y in range(walls.height) if not walls[x][y]]
+    self.cellIds = dict((cell, i) for i, cell in enumerate(self.cells))
+    self.size = len(self.cells)
+    if distances is None or len(distances) != self.size * self.size:
+      distances = self.computeDistances(walls)
+    self.distances = distances
+
+  def computeDistances(self, walls):
+    n = self.size
+    neighbors = []
+    for x, y in self.cells:
+      adjacent = [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]
+      neighbors.append([self.cellIds[cell] for cell in adjacent if cell in self.cellIds])
+
+    distances = array('H', [self.UNREACHABLE]) * (n * n)
+    for source in range(n):
+      row = source * n
+      distances[row + source] = 0
+      frontier = [source]
+      dist = 0
+      while frontier:
+        dist += 1
+        nextFrontier = []
+        for cell in frontier:
+          for neighbor in neighbors[cell]:
+            if distances[row + neighbor] == self.UNREACHABLE:
+              distances[row + neighbor] = dist
+              nextFrontier.append(neighbor)
+        frontier = nextFrontier
+    return distances
+
+  def cellId(self, pos):
+    cell = self.cellIds.get(pos)
+    if cell is None: # agents between two cells count from the nearest one
+      cell = self.cellIds[nearestPoint(pos)]
+    return cell
+
+  def distance(self, pos1, pos2):
+    dist = self.distances[self.cellId(pos1) * self.size + self.cellId(pos2)]
+    if dist == self.UNREACHABLE:
+      return float('inf')
+    return dist
+
+  def forLayout(layout):
+    """
+    Loads the table of a layout from MAZE_DISTANCE_DIR if it is there,
+    otherwise computes it (and saves it there when the directory is set).
+    """
+    if MAZE_DISTANCE_DIR is None:
+      return MazeDistances(layout.walls)
+
+    digest = hashlib.sha1("\n".join(layout.layoutText).encode()).hexdigest()
+    path = os.path.join(MAZE_DISTANCE_DIR, 'mazeDistances-%s.bin' % digest)
+    distances = None
+    if os.path.exists(path):
+      distances = array('H')
+      f = open(path, 'rb')
+      try: distances.frombytes(f.read())
+      finally: f.close()
+    table = MazeDistances(layout.walls, distances)
+    if table.distances is not distances:
+      if not os.path.isdir(MAZE_DISTANCE_DIR): os.makedirs(MAZE_DISTANCE_DIR)
+      f = open(path, 'wb')
+      try: table.distances.tofile(f)
+      finally: f.close()
+    return table
+  forLayout = staticmethod(forLayout)
+
+def layoutFromText(layoutText):
+  """
+  Returns the (shared, read-only) Layout for a board text, parsing it only
+  the first time it is seen.
+  """
+  layout = LAYOUT_CACHE.get(layoutText)
+  if layout is None:
+    layout = LAYOUT_CACHE[layoutText] = Layout(list(layoutText))
+  return layout
+
 def getLayout(name, back = 2):
   if name.endswith('.lay'):
     layout = tryToLoad('layouts/' + name)
@@ -29,6 +29,7 @@ from game import GameStateData
 from game import Game
 from game import Directions
 from game import Actions
+from game import Configuration
 from util import nearestPoint
 from util import manhattanDistance
 import util, layout
@@ -89,7 +90,7 @@ class GameState:
     if agentIndex == 0:
       state.data.scoreChange += -TIME_PENALTY # Penalty for waiting around
     else:
-      GhostRules.decrementTimer( state.data.agentStates[agentIndex] )
+      GhostRules.decrementTimer( state.data.mutableAgentState( agentIndex ) )
 
     # Resolve multi-agent effects
     GhostRules.checkDeath( state, agentIndex )
@@ -97,8 +98,16 @@ class GameState:
     # Book keeping
     state.data._agentMoved = agentIndex
     state.data.score += state.data.scoreChange
+    state.data.rehashAgents( state.data.changedAgents() )
     return state
 
+  def stateKey( self ):
+    """
+    Returns a 64-bit key identifying this state, cheap enough to use for
+    caches and duplicate detection during search.
+    """
+    return self.data.stateKey()
+
   def getLegalPacmanActions( self ):
     return self.getLegalActions( 0 )
 
@@ -181,6 +190,13 @@ class GameState:
   def hasWall(self, x, y):
     return self.data.layout.walls[x][y]
 
+  def mazeDistance(self, pos1, pos2):
+    """
+    Returns the length of the shortest path between two positions through
+    the maze (O(1), from a table built once per layout).
+    """
+    return self.data.layout.mazeDistance(pos1, pos2)
+
   def isLose( self ):
     return self.data._lose
 
@@ -306,7 +322,7 @@ class PacmanRules:
     """
     Returns a list of possible actions.
     """
-    return Actions.getPossibleActions( state.getPacmanState().configuration, state.data.layout.walls )
+    return Actions.getPossibleActions( state.data.agentStates[0].configuration, state.data.layout.walls )
   getLegalActions = staticmethod( getLegalActions )
 
   def applyAction( state, action ):
@@ -317,7 +333,7 @@ class PacmanRules:
     if action not in legal:
       raise Exception("Illegal action " + str(action))
 
-    pacmanState = state.data.agentStates[0]
+    pacmanState = state.data.mutableAgentState( 0 )
 
     # Update Configuration
     vector = Actions.directionToVector( action, PacmanRules.PACMAN_SPEED )
@@ -336,8 +352,7 @@ class PacmanRules:
     # Eat food
     if state.data.food[x][y]:
       state.data.scoreChange += 10
-      state.data.food = state.data.food.copy()
-      state.data.food[x][y] = False
+      state.data.eatFood( position )
       state.data._foodEaten = position
       # TODO: cache numFood?
       numFood = state.getNumFood()
@@ -346,11 +361,11 @@ class PacmanRules:
         state.data._win = True
     # Eat capsule
     if( position in state.getCapsules() ):
-      state.data.capsules.remove( position )
+      state.data.eatCapsule( position )
       state.data._capsuleEaten = position
       # Reset all ghosts' scared timers
       for index in range( 1, len( state.data.agentStates ) ):
-        state.data.agentStates[index].scaredTimer = SCARED_TIME
+        state.data.mutableAgentState( index ).scaredTimer = SCARED_TIME
   consume = staticmethod( consume )
 
 class GhostRules:
@@ -379,7 +394,7 @@ class GhostRules:
     if action not in legal:
       raise Exception("Illegal ghost action " + str(action))
 
-    ghostState = state.data.agentStates[ghostIndex]
+    ghostState = state.data.mutableAgentState( ghostIndex )
     speed = GhostRules.GHOST_SPEED
     if ghostState.scaredTimer > 0: speed /= 2.0
     vector = Actions.directionToVector( action, speed )
@@ -389,7 +404,8 @@ class GhostRules:
   def decrementTimer( ghostState):
     timer = ghostState.scaredTimer
     if timer == 1:
-      ghostState.configuration.pos = nearestPoint( ghostState.configuration.pos )
+      # Replace rather than mutate: configurations are shared with predecessor states
+      ghostState.configuration = Configuration( nearestPoint( ghostState.configuration.pos ), ghostState.configuration.direction )
     ghostState.scaredTimer = max( 0, timer - 1 )
   decrementTimer = staticmethod( decrementTimer )
 
@@ -411,6 +427,7 @@ class GhostRules:
   def collide( state, ghostState, agentIndex):
     if ghostState.scaredTimer > 0:
       state.data.scoreChange += 200
+      ghostState = state.data.mutableAgentState( agentIndex )
       GhostRules.placeGhost(state, ghostState)
       ghostState.scaredTimer = 0
       # Added for first-person
@@ -498,12 +515,24 @@ def readCommand( argv ):
                     help='Turns on exception handling and timeouts during games', default=False)
   parser.add_option('--timeout', dest='timeout', type='int',
                     help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+  parser.add_option('--batch', dest='batch', type='int',
+                    help=default('Play GAMES headless games in a batch and only report results'), metavar='GAMES', default=0)
+  parser.add_option('--workers', dest='workers', type='int',
+                    help=default('Number of processes playing the batch games'), default=1)
+  parser.add_option('--batchSeed', dest='batchSeed', type='int',
+                    help=default('Seed of the batch; game i is played with the seed "SEED-i"'), metavar='SEED', default=0)
+  parser.add_option('--batchOutput', dest='batchOutput',
+                    help=default('JSON-lines file receiving one result per finished batch game'),
+                    metavar='FILE', default='batch-results.jsonl')
 
   options, otherjunk = parser.parse_args(argv)
   if len(otherjunk) != 0:
     raise Exception('Command line input not understood: ' + str(otherjunk))
   args = dict()
 
+  # Batch games are never displayed
+  if options.batch > 0: options.quietGraphics = True
+
   # Fix the random seed
   if options.fixRandomSeed: random.seed('cs188')
 
@@ -557,6 +586,13 @@ def readCommand( argv ):
     replayGame(**recorded)
     sys.exit(0)
 
+  # Special case: batches build their own agents in every game, so they get the agent specifications
+  if options.batch > 0:
+    ghostOpts = {'type': options.ghost, 'count': options.numGhosts}
+    runBatch(args['layout'], options.pacman, agentOpts, ghostOpts, options.batch, options.workers,
+             options.batchSeed, options.batchOutput, options.catchExceptions, options.timeout)
+    sys.exit(0)
+
   return args
 
 def loadAgent(pacman, nographics):
@@ -641,6 +677,78 @@ def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0
 
   return games
 
+def runBatchGame(job):
+  """
+  Plays one headless batch game with fresh agents and a random generator
+  seeded for this game alone, and returns its result as a dict ('moves'
+  counts Pacman's moves only).
+  """
+  index, seed, layout, pacmanType, agentOpts, ghostOpts, catchExceptions, timeout = job
+  import textDisplay
+  random.seed(seed)
+  pacman = loadAgent(pacmanType, True)(**agentOpts)
+  ghostType = loadAgent(ghostOpts['type'], True)
+  ghosts = [ghostType(i+1) for i in range(ghostOpts['count'])]
+
+  rules = ClassicGameRules(timeout)
+  rules.quiet = True
+  start = time.time()
+  game = rules.newGame(layout, pacman, ghosts, textDisplay.NullGraphics(), True, catchExceptions)
+  game.run()
+  return {'game': index, 'seed': seed, 'score': game.state.getScore(), 'win': game.state.isWin(),
+          'moves': len([agentIndex for agentIndex, action in game.moveHistory if agentIndex == 0]), 'crashed': game.agentCrashed, 'timedOut': game.agentTimeout,
+          'agentTimes': game.totalAgentTimes, 'time': time.time() - start}
+
+def runBatch( layout, pacmanType, agentOpts, ghostOpts, numGames, workers, batchSeed, output, catchExceptions=False, timeout=30 ):
+  """
+  Plays numGames headless games on a pool of worker processes.  Results are
+  appended to the JSON-lines file output in the order the games finish,
+  and only the results are kept, so batches can be arbitrarily long.
+  """
+  import json
+  jobs = [(i, '%d-%d' % (batchSeed, i), layout, pacmanType, agentOpts, ghostOpts, catchExceptions, timeout)
+          for i in range(numGames)]
+
+  pool = None
+  if workers > 1:
+    import multiprocessing
+    if int(agentOpts.get('parallel', 1)) > 1:
+      print('parallel=%s ignored: the agents of batch worker processes search serially' % agentOpts['parallel'])
+    pool = multiprocessing.Pool(workers)
+    results = pool.imap_unordered(runBatchGame, jobs)
+  else:
+    results = map(runBatchGame, jobs)
+
+  start = time.time()
+  scores, wins, moves, agentTimes = [], [], [], []
+  f = open(output, 'w')
+  try:
+    for result in results:
+      f.write(json.dumps(result) + '\n')
+      f.flush()
+      scores.append(result['score'])
+      wins.append(result['win'])
+      moves.append(result['moves'])
+      agentTimes.append(result['agentTimes'])
+  finally:
+    f.close()
+    if pool is not None:
+      pool.close()
+      pool.join()
+
+  scores.sort()
+  n = len(scores)
+  mean = sum(scores) / float(n)
+  deviation = (sum([(score - mean) ** 2 for score in scores]) / float(n)) ** 0.5
+  quartiles = [scores[min(n - 1, int(q * n))] for q in (0.25, 0.5, 0.75)]
+  print('Games:         %d in %.1fs (%d workers), results in %s' % (n, time.time() - start, workers, output))
+  print('Average Score:', mean)
+  print('Score Std Dev: %.1f' % deviation)
+  print('Scores:        min %s, 25%% %s, median %s, 75%% %s, max %s' % tuple([scores[0]] + quartiles + [scores[-1]]))
+  print('Win Rate:      %d/%d (%.2f)' % (wins.count(True), n, wins.count(True) / float(n)))
+  print('Pacman Moves:  %.1f' % (sum(moves) / float(n)))
+  print('Agent Times:  ', ', '.join(['%.3f' % (sum(times) / float(n)) for times in zip(*agentTimes)]))
+
 if __name__ == '__main__':
   """
   The main function called when pacman.py is run
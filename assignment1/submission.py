@@ -7,7 +7,7 @@
 
 from util import manhattanDistance
 from game import Directions
-import random, util
+import random, time, util
 
 from game import Agent
 
@@ -123,10 +123,186 @@ class MultiAgentSearchAgent(Agent):
     is another abstract class.
   """
 
-  def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2'):
+  # Search the root tasks in rounds of self.parallel, so that later rounds see
+  # the bounds found by earlier ones (only useful to alpha-beta)
+  parallelRounds = False
+
+  def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', ttSize = '100000', parallel = '1'):
     self.index = 0 # Pacman is always agent index 0
     self.evaluationFunction = util.lookup(evalFn, globals())
     self.depth = int(depth)
+    # Transposition table shared by every search of this agent, ttSize=0 disables it
+    self.transpositionTable = util.TranspositionTable(int(ttSize)) if int(ttSize) > 0 else None
+    # Number of worker processes searching the root moves, 1 searches serially
+    self.parallel = int(parallel)
+    if self.parallel > 1:
+      import multiprocessing
+      # Daemonic pool workers (pacman.py --batch --workers) cannot start
+      # processes of their own, so the agents they build search serially
+      if multiprocessing.current_process().daemon:
+        self.parallel = 1
+    self.pool = None
+    # (game, move) numbers of the current search, so the long-lived worker
+    # copies of the agent know when a new move or a new game starts
+    self.searchId = (0, 0)
+
+  def registerInitialState(self, gameState):
+    """
+      Forgets the states searched in a previous game, which may have been
+      played on another layout.
+    """
+    if self.transpositionTable is not None:
+      self.transpositionTable.clear()
+    self.searchId = (self.searchId[0] + 1, 0)
+
+  def final(self, gameState):
+    """
+      Shuts the worker processes down at the end of a game.
+    """
+    self.closePool()
+
+  def getPool(self):
+    """
+      The pool of worker processes, started on first use.  Each worker gets
+      its own copy of the agent once, when it starts, and keeps it (and its
+      transposition table) for every search it takes part in.
+    """
+    if self.pool is None:
+      import atexit, multiprocessing
+      self.pool = multiprocessing.Pool(self.parallel, initSearchWorker, (self,))
+      # Drivers that never call final (the grader, say) still stop the workers
+      atexit.register(self.closePool)
+    return self.pool
+
+  def closePool(self):
+    """
+      Stops the worker processes, if any are running.
+    """
+    if self.pool is not None:
+      import atexit
+      self.pool.close()
+      self.pool.join()
+      self.pool = None
+      atexit.unregister(self.closePool)
+
+  def __getstate__(self):
+    # Workers get a copy of the agent without the pool and with an empty table
+    state = self.__dict__.copy()
+    state['pool'] = None
+    if self.transpositionTable is not None:
+      state['transpositionTable'] = util.TranspositionTable(self.transpositionTable.maxSize)
+    return state
+
+  def startSearch(self, searchId):
+    """
+      Called in a worker before its first task of a new move; the table is
+      only kept within a game.
+    """
+    if self.transpositionTable is not None and searchId[0] != self.searchId[0]:
+      self.transpositionTable.clear()
+    self.searchId = searchId
+
+  def searchStats(self):
+    """
+      Statistics gathered by the searches since the last call, which a worker
+      sends back with each result.  Nothing by default.
+    """
+    return None
+
+  def mergeSearchStats(self, stats):
+    """
+      Adds the searchStats of a worker to this agent's.
+    """
+    pass
+
+  def transpositionKey(self, gameState, dep, agent, depth = None):
+    """
+      Key of a search node: the state itself, the number of plies still to
+      search below it and the agent to move.  depth defaults to self.depth.
+    """
+    if depth is None:
+      depth = self.depth
+    return (gameState.stateKey(), depth - dep, agent)
+
+  def getParallelAction(self, gameState):
+    """
+      Root-split search: the subtrees below the root (see rootTasks) are
+      searched by a pool of self.parallel worker processes and their values
+      combined here.  Ties go to the first best move in getLegalActions
+      order, so the move is the one the serial search would pick.
+    """
+    legalMoves = gameState.getLegalActions(self.index)
+    if not legalMoves:
+      return Directions.STOP
+
+    tasks = [self.rootTasks(gameState, action) for action in legalMoves]
+    jobs = [task for actionTasks in tasks for task in actionTasks]
+    roundSize = self.parallel if self.parallelRounds else len(jobs)
+    pool = self.getPool()
+    self.searchId = (self.searchId[0], self.searchId[1] + 1)
+
+    values = {}
+    alpha = -float("inf")
+    for start in range(0, len(jobs), roundSize):
+      batch = jobs[start:start + roundSize]
+      results = []
+      for value, stats in pool.map(searchRootTask, [(gameState, task, alpha, self.searchId) for task in batch]):
+        results.append(value)
+        self.mergeSearchStats(stats)
+      values.update(zip(batch, results))
+      alpha = max([alpha] + results)
+
+    utils = [self.rootValue([values[task] for task in actionTasks]) for actionTasks in tasks]
+    bestUtil = max(utils)
+    return legalMoves[utils.index(bestUtil)]
+
+  def rootTasks(self, gameState, action):
+    """
+      The independent searches making up the value of playing action at the
+      root, as (action, ghostAction) pairs; ghostAction is None when the
+      whole subtree is a single task.
+    """
+    return [(action, None)]
+
+  def rootValue(self, values):
+    """
+      Combines the values of the tasks of one root move.
+    """
+    return values[0]
+
+  def searchRootTask(self, gameState, task, alpha):
+    """
+      Value of one task from rootTasks.  alpha is the best root value found
+      by the previous rounds.
+    """
+    util.raiseNotDefined()
+
+class SearchTimeout(Exception):
+  """
+    Raised inside a search when its time budget is spent.
+  """
+  pass
+
+# The copy of the searching agent owned by a worker process
+workerAgent = None
+
+def initSearchWorker(agent):
+  """
+    Initializer of the parallel search workers: keeps the agent they search with.
+  """
+  global workerAgent
+  workerAgent = agent
+
+def searchRootTask(job):
+  """
+    Entry point of the parallel search workers (module level so it can be
+    pickled).  Returns the value of the task and the worker's searchStats.
+  """
+  gameState, task, alpha, searchId = job
+  if searchId != workerAgent.searchId:
+    workerAgent.startSearch(searchId)
+  value = workerAgent.searchRootTask(gameState, task, alpha)
+  return value, workerAgent.searchStats()
 
 ######################################################################################
 # Problem 1a: implementing minimax
@@ -172,13 +348,34 @@ class MinimaxAgent(MultiAgentSearchAgent):
     """
 
     # BEGIN_YOUR_ANSWER (our solution is 30 lines of code, but don't worry if you deviate from this)
+    if self.parallel > 1 and self.depth > 0:
+      return self.getParallelAction(gameState)
+
+    maximizer, minimizer = self.searchFunctions(gameState.getNumAgents())
+    move = maximizer(gameState, 0)
+    # print(move[0])
+    return move[1]
+    # END_YOUR_ANSWER
+
+  def searchFunctions(self, AGENT_COUNT):
+    """
+      Returns the (maximizer, minimizer) node functions for a game of
+      AGENT_COUNT agents.
+    """
     PACMAN = 0
-    AGENT_COUNT = gameState.getNumAgents()
+
+    table = self.transpositionTable
 
     def maximizer(gameState, dep):
       if dep == self.depth or gameState.isWin() or gameState.isLose(): # terminal condition
         return [self.evaluationFunction(gameState), Directions.STOP]
 
+      if table is not None: # already searched through another move order?
+        key = self.transpositionKey(gameState, dep, PACMAN)
+        entry = table.lookup(key)
+        if entry is not None:
+          return [entry[0], entry[2]]
+
       legalMoves = gameState.getLegalActions(PACMAN) # get pacman's all legalMoves
 
       utils = []
@@ -186,13 +383,23 @@ class MinimaxAgent(MultiAgentSearchAgent):
         utils.append(minimizer(gameState.generateSuccessor(PACMAN, action), dep, 1))
 
       bestUtil = max(utils) # get max utility
+      move = legalMoves[utils.index(bestUtil)]
 
-      return [bestUtil, legalMoves[utils.index(bestUtil)]]
+      if table is not None:
+        table.store(key, bestUtil, util.TranspositionTable.EXACT, move)
+
+      return [bestUtil, move]
 
     def minimizer(gameState, dep, agent):
       if gameState.isWin() or gameState.isLose(): # terminal condition
         return self.evaluationFunction(gameState)
 
+      if table is not None:
+        key = self.transpositionKey(gameState, dep, agent)
+        entry = table.lookup(key)
+        if entry is not None:
+          return entry[0]
+
       legalMoves = gameState.getLegalActions(agent)
 
       utils = []
@@ -207,12 +414,17 @@ class MinimaxAgent(MultiAgentSearchAgent):
         
       worstUtil = min(utils) # get minimum utility
 
+      if table is not None:
+        table.store(key, worstUtil)
+
       return worstUtil
-      
-    move = maximizer(gameState, PACMAN)
-    # print(move[0])
-    return move[1]
-    # END_YOUR_ANSWER
+
+    return maximizer, minimizer
+
+  def searchRootTask(self, gameState, task, alpha):
+    action, ghostAction = task
+    maximizer, minimizer = self.searchFunctions(gameState.getNumAgents())
+    return minimizer(gameState.generateSuccessor(self.index, action), 0, 1)
 
 ######################################################################################
 # Problem 2b: implementing alpha-beta
@@ -222,76 +434,313 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
     Your minimax agent with alpha-beta pruning (problem 2)
   """
 
+  parallelRounds = True
+
+  # Move ordering heuristics, tried in this order of precedence
+  ORDERINGS = ['pv', 'killer', 'history', 'eval']
+
+  def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', ttSize = '100000', parallel = '1', timeLimit = '0',
+               ordering = 'pv', stats = '0'):
+    MultiAgentSearchAgent.__init__(self, evalFn, depth, ttSize, parallel)
+    # Seconds per move for iterative deepening, 0 searches to self.depth
+    self.timeLimit = float(timeLimit)
+    if self.timeLimit > 0 and int(parallel) > 1:
+      raise Exception('timeLimit and parallel cannot be combined: iterative deepening searches serially')
+    # '+' separated subset of ORDERINGS, e.g. ordering=pv+killer+history
+    self.ordering = set(name for name in ordering.split('+') if name)
+    for name in self.ordering:
+      if name not in self.ORDERINGS:
+        raise Exception('Unknown move ordering: ' + name)
+    self.killers = {}
+    self.history = util.Counter()
+    # Nodes visited and cutoffs per ply (one ply per agent move), printed after each game with stats=1
+    self.showStats = stats not in ['0', 0, False]
+    self.nodeCounts = util.Counter()
+    self.cutoffCounts = util.Counter()
+
+  def registerInitialState(self, gameState):
+    MultiAgentSearchAgent.registerInitialState(self, gameState)
+    self.history = util.Counter()
+    self.nodeCounts = util.Counter()
+    self.cutoffCounts = util.Counter()
+
+  def final(self, gameState):
+    MultiAgentSearchAgent.final(self, gameState)
+    if self.showStats:
+      print(self.statsReport())
+
+  def statsReport(self):
+    """
+      Table of the nodes visited and cutoffs per ply since the game started,
+      followed by the transposition table hits and misses.
+    """
+    lines = ['%4s %10s %10s %8s' % ('ply', 'nodes', 'cutoffs', 'growth')]
+    previous = None
+    for ply in sorted(self.nodeCounts.keys()):
+      nodes = self.nodeCounts[ply]
+      growth = '%8.2f' % (float(nodes) / previous) if previous else '%8s' % '-'
+      lines.append('%4d %10d %10d %s' % (ply, nodes, self.cutoffCounts[ply], growth))
+      previous = nodes
+    table = self.transpositionTable
+    if table is not None:
+      probes = table.hits + table.misses
+      rate = '%.1f%%' % (100.0 * table.hits / probes) if probes else '-'
+      lines.append('transposition table: %d hits, %d misses (%s hit rate)' % (table.hits, table.misses, rate))
+    return '\n'.join(lines)
+
+  def startSearch(self, searchId):
+    MultiAgentSearchAgent.startSearch(self, searchId)
+    self.killers = {}
+
+  def searchStats(self):
+    """
+      The node and cutoff counts and the table hits and misses since the
+      last call.
+    """
+    table = self.transpositionTable
+    stats = (self.nodeCounts, self.cutoffCounts, table.hits if table else 0, table.misses if table else 0)
+    self.nodeCounts = util.Counter()
+    self.cutoffCounts = util.Counter()
+    if table is not None:
+      table.hits = table.misses = 0
+    return stats
+
+  def mergeSearchStats(self, stats):
+    nodeCounts, cutoffCounts, hits, misses = stats
+    if self.transpositionTable is not None:
+      self.transpositionTable.hits += hits
+      self.transpositionTable.misses += misses
+    for ply, count in nodeCounts.items():
+      self.nodeCounts[ply] += count
+    for ply, count in cutoffCounts.items():
+      self.cutoffCounts[ply] += count
+
   def getAction(self, gameState):
     """
       Returns the minimax action using self.depth and self.evaluationFunction
     """
 
     # BEGIN_YOUR_ANSWER (our solution is 42 lines of code, but don't worry if you deviate from this)
-    PACMAN = 0
+    self.killers = {}
+
+    if self.timeLimit > 0:
+      return self.getIterativeAction(gameState)
+
+    if self.parallel > 1 and self.depth > 0:
+      return self.getParallelAction(gameState)
+
+    maximizer, minimizer = self.searchFunctions(gameState.getNumAgents())
+    move = maximizer(gameState, 0, -float("inf"), float("inf"))
+    # print(move[0])
+    return move[1]
+    # END_YOUR_ANSWER
+
+  def getIterativeAction(self, gameState):
+    """
+      Iterative deepening: searches to depth 1, 2, 3, ... until self.timeLimit
+      seconds are spent and returns the move of the deepest completed search.
+      With the 'pv' ordering each iteration tries the best moves of the
+      previous one first.
+    """
+    deadline = time.time() + self.timeLimit
     AGENT_COUNT = gameState.getNumAgents()
-    alpha = -float("inf")
-    beta = float("inf")
+    hints = {}
+    move = Directions.STOP
+    depth = 1
+    while True:
+      maximizer, minimizer = self.searchFunctions(AGENT_COUNT, depth, deadline, hints)
+      try:
+        move = maximizer(gameState, 0, -float("inf"), float("inf"))[1]
+      except SearchTimeout:
+        break
+      if not self.lastSearch['horizon']: # the whole game tree fits in this depth
+        break
+      depth += 1
+    return move
+
+  def searchFunctions(self, AGENT_COUNT, depth = None, deadline = None, hints = None):
+    """
+      Returns the (maximizer, minimizer) node functions for a game of
+      AGENT_COUNT agents.  With a depth the search stops there instead of at
+      self.depth; after the deadline (a time.time() value) the node functions
+      raise SearchTimeout.  hints maps state keys to the move to try first
+      (the 'pv' ordering) and is updated with the best moves found.
+      self.lastSearch['horizon'] tells whether the search was cut off by the
+      depth.
+    """
+    PACMAN = 0
+    DEPTH = self.depth if depth is None else depth
+
+    ORDERING = self.ordering if hints is not None else self.ordering - set(['pv'])
+    killers = self.killers
+    history = self.history
+    nodeCounts = self.nodeCounts
+    cutoffCounts = self.cutoffCounts
+
+    table = self.transpositionTable
+    search = self.lastSearch = {'horizon': False}
+    EXACT = util.TranspositionTable.EXACT
+    LOWER = util.TranspositionTable.LOWER
+    UPPER = util.TranspositionTable.UPPER
+
+    def probe(key, alpha, beta):
+      # a stored value is usable if it is exact or if its bound alone causes a cutoff
+      entry = table.lookup(key)
+      if entry is None:
+        return None
+      value, bound, move = entry
+      if bound == EXACT or (bound == LOWER and value > beta) or (bound == UPPER and value < alpha):
+        return entry
+      return None
+
+    def record(key, value, alpha, beta, move = None):
+      # values outside the search window are only bounds on the true value
+      if value <= alpha:
+        bound = UPPER
+      elif value >= beta:
+        bound = LOWER
+      else:
+        bound = EXACT
+      table.store(key, value, bound, move)
+
+    def agentPosition(gameState, agent):
+      if agent == PACMAN:
+        return gameState.getPacmanPosition()
+      return gameState.getGhostPosition(agent)
+
+    def order(gameState, dep, agent, legalMoves):
+      # (action, successor or None) pairs, most promising first; ties keep the legal order
+      if not ORDERING:
+        return [(action, None) for action in legalMoves]
+
+      successors = {}
+      evals = {}
+      if 'eval' in ORDERING:
+        sign = 1 if agent == PACMAN else -1
+        for action in legalMoves:
+          successors[action] = gameState.generateSuccessor(agent, action)
+          evals[action] = sign * self.evaluationFunction(successors[action])
+      pv = hints.get(gameState.stateKey()) if 'pv' in ORDERING and agent == PACMAN else None
+      plyKillers = killers.get(dep * AGENT_COUNT + agent, ()) if 'killer' in ORDERING else ()
+      position = agentPosition(gameState, agent) if 'history' in ORDERING else None
+
+      def score(action):
+        return (action == pv, action in plyKillers, history[(agent, position, action)] if position else 0,
+                evals.get(action, 0))
+
+      return [(action, successors.get(action)) for action in sorted(legalMoves, key = score, reverse = True)]
+
+    def cutoff(gameState, dep, agent, action):
+      # remember the refutation for the killer and history heuristics
+      ply = dep * AGENT_COUNT + agent
+      cutoffCounts[ply] += 1
+      if 'killer' in ORDERING:
+        plyKillers = killers.setdefault(ply, [])
+        if action not in plyKillers:
+          plyKillers.insert(0, action)
+          del plyKillers[2:]
+      if 'history' in ORDERING:
+        history[(agent, agentPosition(gameState, agent), action)] += (DEPTH - dep) ** 2
+
+    def terminal(gameState, dep):
+      if gameState.isWin() or gameState.isLose():
+        return True
+      if dep == DEPTH:
+        search['horizon'] = True
+        return True
+      if deadline is not None and time.time() > deadline:
+        raise SearchTimeout()
+      return False
 
     def maximizer(gameState, dep, alpha, beta):
-      if dep == self.depth or gameState.isWin() or gameState.isLose(): # terminal condition
+      nodeCounts[dep * AGENT_COUNT] += 1
+      if terminal(gameState, dep): # terminal condition
         return [self.evaluationFunction(gameState), Directions.STOP]
 
+      if table is not None:
+        key = self.transpositionKey(gameState, dep, PACMAN, DEPTH)
+        entry = probe(key, alpha, beta)
+        if entry is not None:
+          search['horizon'] = True # the stored search may have been cut off
+          return [entry[0], entry[2]]
+        alphaOrig = alpha
+
       legalMoves = gameState.getLegalActions(PACMAN) # get pacman's all legalMoves
 
       util = -float("inf")
       move = Directions.STOP
 
-      for action in legalMoves:
-        value = minimizer(gameState.generateSuccessor(PACMAN, action), dep, 1, alpha, beta)
+      for action, successor in order(gameState, dep, PACMAN, legalMoves):
+        if successor is None:
+          successor = gameState.generateSuccessor(PACMAN, action)
+        value = minimizer(successor, dep, 1, alpha, beta)
         if util < value:
           util = value
           move = action
 
         if util > beta:
+          cutoff(gameState, dep, PACMAN, action)
+          if table is not None:
+            record(key, util, alphaOrig, beta, action)
+          if hints is not None:
+            hints[gameState.stateKey()] = action
           return [util, action]
         
         alpha = max(alpha, util)
 
+      if table is not None:
+        record(key, util, alphaOrig, beta, move)
+      if hints is not None:
+        hints[gameState.stateKey()] = move
+
       return [util, move]
 
     def minimizer(gameState, dep, agent, alpha, beta):
-      if dep == self.depth or gameState.isWin() or gameState.isLose(): # terminal condition
+      nodeCounts[dep * AGENT_COUNT + agent] += 1
+      if terminal(gameState, dep): # terminal condition
         return self.evaluationFunction(gameState)
 
+      if table is not None:
+        key = self.transpositionKey(gameState, dep, agent, DEPTH)
+        entry = probe(key, alpha, beta)
+        if entry is not None:
+          search['horizon'] = True
+          return entry[0]
+        betaOrig = beta
+
       legalMoves = gameState.getLegalActions(agent)
 
       util = float("inf")
       nextAgent = agent + 1
 
-      if nextAgent == AGENT_COUNT: # next turn is pacman's turn
-        for action in legalMoves:
-          value = maximizer(gameState.generateSuccessor(agent, action), dep + 1, alpha, beta)[0]
-          if util > value:
-            util = value
-
-          if util < alpha:
-            return util
-          
-          beta = min(beta, util)
+      for action, successor in order(gameState, dep, agent, legalMoves):
+        if successor is None:
+          successor = gameState.generateSuccessor(agent, action)
+        if nextAgent == AGENT_COUNT: # next turn is pacman's turn
+          value = maximizer(successor, dep + 1, alpha, beta)[0]
+        else:
+          value = minimizer(successor, dep, nextAgent, alpha, beta)
+        if util > value:
+          util = value
 
-      else: 
-        for action in legalMoves:
-          value = minimizer(gameState.generateSuccessor(agent, action), dep, nextAgent, alpha, beta)
-          if util > value:
-            util = value
+        if util < alpha:
+          cutoff(gameState, dep, agent, action)
+          break
+        
+        beta = min(beta, util)
 
-          if util < alpha:
-            return util
-          
-          beta = min(beta, util)
+      if table is not None:
+        record(key, util, alpha, betaOrig)
 
       return util
-      
-    move = maximizer(gameState, PACMAN, alpha, beta)
-    # print(move[0])
-    return move[1]
-    # END_YOUR_ANSWER
+
+    return maximizer, minimizer
+
+  def searchRootTask(self, gameState, task, alpha):
+    # A move that cannot beat alpha only gets an upper bound, which never wins the tie-break
+    action, ghostAction = task
+    maximizer, minimizer = self.searchFunctions(gameState.getNumAgents())
+    return minimizer(gameState.generateSuccessor(self.index, action), 0, 1, alpha, float("inf"))
 
 ######################################################################################
 # Problem 3a: implementing expectimax
@@ -310,13 +759,34 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
     """
 
     # BEGIN_YOUR_ANSWER (our solution is 30 lines of code, but don't worry if you deviate from this)
+    if self.parallel > 1 and self.depth > 0:
+      return self.getParallelAction(gameState)
+
+    maximizer, expectNode = self.searchFunctions(gameState.getNumAgents())
+    move = maximizer(gameState, 0)
+    # print(move[0])
+    return move[1]
+    # END_YOUR_ANSWER
+
+  def searchFunctions(self, AGENT_COUNT):
+    """
+      Returns the (maximizer, expectNode) node functions for a game of
+      AGENT_COUNT agents.
+    """
     PACMAN = 0
-    AGENT_COUNT = gameState.getNumAgents()
+
+    table = self.transpositionTable
 
     def maximizer(gameState, dep):
       if dep == self.depth or gameState.isWin() or gameState.isLose(): # terminal condition
         return [self.evaluationFunction(gameState), Directions.STOP]
 
+      if table is not None: # already searched through another move order?
+        key = self.transpositionKey(gameState, dep, PACMAN)
+        entry = table.lookup(key)
+        if entry is not None:
+          return [entry[0], entry[2]]
+
       legalMoves = gameState.getLegalActions(PACMAN) # get pacman's all legalMoves
 
       utils = []
@@ -324,13 +794,23 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
         utils.append(expectNode(gameState.generateSuccessor(PACMAN, action), dep, 1))
 
       bestUtil = max(utils) # get max utility
+      move = legalMoves[utils.index(bestUtil)]
 
-      return [bestUtil, legalMoves[utils.index(bestUtil)]]
+      if table is not None:
+        table.store(key, bestUtil, util.TranspositionTable.EXACT, move)
+
+      return [bestUtil, move]
 
     def expectNode(gameState, dep, agent):
       if dep == self.depth or gameState.isWin() or gameState.isLose(): # terminal condition
         return self.evaluationFunction(gameState)
 
+      if table is not None:
+        key = self.transpositionKey(gameState, dep, agent)
+        entry = table.lookup(key)
+        if entry is not None:
+          return entry[0]
+
       legalMoves = gameState.getLegalActions(agent)
       util = 0
       nextAgent = agent + 1
@@ -341,13 +821,41 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
       else: 
         for action in legalMoves:
           util += expectNode(gameState.generateSuccessor(agent, action), dep, nextAgent)
-        
-      return util / len(legalMoves)
-      
-    move = maximizer(gameState, PACMAN)
-    # print(move[0])
-    return move[1]
-    # END_YOUR_ANSWER
+
+      util /= len(legalMoves)
+
+      if table is not None:
+        table.store(key, util)
+
+      return util
+
+    return maximizer, expectNode
+
+  def rootTasks(self, gameState, action):
+    # Split one ply further: each reply of the first ghost is its own task
+    successor = gameState.generateSuccessor(self.index, action)
+    if successor.isWin() or successor.isLose():
+      return [(action, None)]
+    return [(action, ghostAction) for ghostAction in successor.getLegalActions(1)]
+
+  def rootValue(self, values):
+    # Same order of additions as expectNode, so the averages are bit-identical
+    util = 0
+    for value in values:
+      util += value
+    return util / len(values)
+
+  def searchRootTask(self, gameState, task, alpha):
+    action, ghostAction = task
+    AGENT_COUNT = gameState.getNumAgents()
+    maximizer, expectNode = self.searchFunctions(AGENT_COUNT)
+    successor = gameState.generateSuccessor(self.index, action)
+    if ghostAction is None:
+      return expectNode(successor, 0, 1)
+    successor = successor.generateSuccessor(1, ghostAction)
+    if AGENT_COUNT == 2: # next turn is pacman's turn
+      return maximizer(successor, 1)[0]
+    return expectNode(successor, 0, 2)
 
 ######################################################################################
 # Problem 4a (extra credit): creating a better evaluation function
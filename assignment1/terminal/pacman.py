@@ -29,6 +29,7 @@ from game import GameStateData
 from game import Game
 from game import Directions
 from game import Actions
+from game import Configuration
 from util import nearestPoint
 from util import manhattanDistance
 import util, layout
@@ -89,7 +90,7 @@ class GameState:
     if agentIndex == 0:
       state.data.scoreChange += -TIME_PENALTY # Penalty for waiting around
     else:
-      GhostRules.decrementTimer( state.data.agentStates[agentIndex] )
+      GhostRules.decrementTimer( state.data.mutableAgentState( agentIndex ) )
 
     # Resolve multi-agent effects
     GhostRules.checkDeath( state, agentIndex )
@@ -97,8 +98,16 @@ class GameState:
     # Book keeping
     state.data._agentMoved = agentIndex
     state.data.score += state.data.scoreChange
+    state.data.rehashAgents( state.data.changedAgents() )
     return state
 
+  def stateKey( self ):
+    """
+    Returns a 64-bit key identifying this state, cheap enough to use for
+    caches and duplicate detection during search.
+    """
+    return self.data.stateKey()
+
   def getLegalPacmanActions( self ):
     return self.getLegalActions( 0 )
 
@@ -181,6 +190,13 @@ class GameState:
   def hasWall(self, x, y):
     return self.data.layout.walls[x][y]
 
+  def mazeDistance(self, pos1, pos2):
+    """
+    Returns the length of the shortest path between two positions through
+    the maze (O(1), from a table built once per layout).
+    """
+    return self.data.layout.mazeDistance(pos1, pos2)
+
   def isLose( self ):
     return self.data._lose
 
@@ -306,7 +322,7 @@ class PacmanRules:
     """
     Returns a list of possible actions.
     """
-    return Actions.getPossibleActions( state.getPacmanState().configuration, state.data.layout.walls )
+    return Actions.getPossibleActions( state.data.agentStates[0].configuration, state.data.layout.walls )
   getLegalActions = staticmethod( getLegalActions )
 
   def applyAction( state, action ):
@@ -317,7 +333,7 @@ class PacmanRules:
     if action not in legal:
       raise Exception("Illegal action " + str(action))
 
-    pacmanState = state.data.agentStates[0]
+    pacmanState = state.data.mutableAgentState( 0 )
 
     # Update Configuration
     vector = Actions.directionToVector( action, PacmanRules.PACMAN_SPEED )
@@ -336,8 +352,7 @@ class PacmanRules:
     # Eat food
     if state.data.food[x][y]:
       state.data.scoreChange += 10
-      state.data.food = state.data.food.copy()
-      state.data.food[x][y] = False
+      state.data.eatFood( position )
       state.data._foodEaten = position
       # TODO: cache numFood?
       numFood = state.getNumFood()
@@ -346,11 +361,11 @@ class PacmanRules:
         state.data._win = True
     # Eat capsule
     if( position in state.getCapsules() ):
-      state.data.capsules.remove( position )
+      state.data.eatCapsule( position )
       state.data._capsuleEaten = position
       # Reset all ghosts' scared timers
       for index in range( 1, len( state.data.agentStates ) ):
-        state.data.agentStates[index].scaredTimer = SCARED_TIME
+        state.data.mutableAgentState( index ).scaredTimer = SCARED_TIME
   consume = staticmethod( consume )
 
 class GhostRules:
@@ -379,7 +394,7 @@ class GhostRules:
     if action not in legal:
       raise Exception("Illegal ghost action " + str(action))
 
-    ghostState = state.data.agentStates[ghostIndex]
+    ghostState = state.data.mutableAgentState( ghostIndex )
     speed = GhostRules.GHOST_SPEED
     if ghostState.scaredTimer > 0: speed /= 2.0
     vector = Actions.directionToVector( action, speed )
@@ -389,7 +404,8 @@ class GhostRules:
   def decrementTimer( ghostState):
     timer = ghostState.scaredTimer
     if timer == 1:
-      ghostState.configuration.pos = nearestPoint( ghostState.configuration.pos )
+      # Replace rather than mutate: configurations are shared with predecessor states
+      ghostState.configuration = Configuration( nearestPoint( ghostState.configuration.pos ), ghostState.configuration.direction )
     ghostState.scaredTimer = max( 0, timer - 1 )
   decrementTimer = staticmethod( decrementTimer )
 
@@ -411,6 +427,7 @@ class GhostRules:
   def collide( state, ghostState, agentIndex):
     if ghostState.scaredTimer > 0:
       state.data.scoreChange += 200
+      ghostState = state.data.mutableAgentState( agentIndex )
       GhostRules.placeGhost(state, ghostState)
       ghostState.scaredTimer = 0
       # Added for first-person
@@ -1,6 +1,6 @@
 import sys
 import inspect
-import heapq, random
+import heapq, random, collections
 
 
 """
@@ -85,6 +85,52 @@ class PriorityQueueWithFunction(PriorityQueue):
     "Adds an item to the queue with priority from the priority function"
     PriorityQueue.push(self, item, self.priorityFunction(item))
 
+class TranspositionTable:
+  """
+    A bounded cache of search results, keyed by game state.
+
+    Each entry records the value found for a state together with the kind
+    of bound it is (EXACT, LOWER or UPPER) and the move that produced it,
+    so that an alpha-beta search can reuse a value only when the bound is
+    tight enough for the current window.  Once the table holds maxSize
+    entries the least recently used one is evicted.  hits and misses count
+    the lookups since the last clear.
+  """
+  EXACT = 0
+  LOWER = 1
+  UPPER = 2
+
+  def __init__(self, maxSize=100000):
+    self.maxSize = maxSize
+    self.table = collections.OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  def lookup(self, key):
+    "Returns the (value, bound, move) entry stored for key, or None"
+    entry = self.table.get(key)
+    if entry is None:
+      self.misses += 1
+      return None
+    self.table.move_to_end(key)
+    self.hits += 1
+    return entry
+
+  def store(self, key, value, bound=EXACT, move=None):
+    "Records a search result for key, evicting the oldest entry if full"
+    self.table[key] = (value, bound, move)
+    self.table.move_to_end(key)
+    if len(self.table) > self.maxSize:
+      self.table.popitem(last=False)
+
+  def clear(self):
+    self.table.clear()
+    self.hits = 0
+    self.misses = 0
+
+  def __len__(self):
+    return len(self.table)
+
     
 def manhattanDistance( xy1, xy2 ):
   "Returns the Manhattan distance between points xy1 and xy2"
@@ -0,0 +1,63 @@
+'''
+Micro-benchmark of the collision geometry: times Car.computeBounds and the
+separating-axis test in Car.collides (which spends most of its time in
+Vec2d.projectPoints) on a crowd of cars, the work Model.checkCollision
+and Agent.isCloseToOtherCar do every heartbeat. Every repeat of the
+collides test starts from empty bounds caches, like a heartbeat after the
+cars moved.
+
+    python benchmarkCollision.py -k 40 -r 20
+'''
+
+from engine.model.car.car import Car
+from engine.vector import Vec2d
+
+import optparse
+import random
+import time
+
+def makeCars(numCars, size):
+    cars = []
+    for _ in range(numCars):
+        pos = Vec2d(random.uniform(0, size), random.uniform(0, size))
+        car = Car(pos, random.choice(['north', 'south', 'east', 'west']), Vec2d(0, 0))
+        car.dir.rotate(random.uniform(-45, 45))
+        cars.append(car)
+    return cars
+
+def timeBounds(cars, repeats):
+    start = time.time()
+    for _ in range(repeats):
+        for car in cars:
+            car.computeBounds()
+    return time.time() - start
+
+def timeCollides(cars, repeats):
+    collisions = 0
+    start = time.time()
+    for _ in range(repeats):
+        for car in cars:
+            car.invalidateBounds()
+        for car in cars:
+            pos = car.getPos()
+            bounds = car.getBounds()
+            for other in cars:
+                if other is not car and other.collides(pos, bounds):
+                    collisions += 1
+    return (time.time() - start, collisions)
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser()
+    parser.add_option('-k', '--numCars', type='int', dest='numCars', default=40)
+    parser.add_option('-r', '--repeats', type='int', dest='repeats', default=20)
+    parser.add_option('-s', '--size', type='float', dest='size', default=300.0)
+    (options, _) = parser.parse_args()
+
+    random.seed('benchmarkCollision')
+    cars = makeCars(options.numCars, options.size)
+    pairs = options.numCars * (options.numCars - 1) * options.repeats
+
+    boundsTime = timeBounds(cars, options.repeats * options.numCars)
+    (collidesTime, collisions) = timeCollides(cars, options.repeats)
+    print('computeBounds: %.2f us/call' % (boundsTime * 1e6 / (options.numCars ** 2 * options.repeats)))
+    print('collides:      %.2f us/pair (%d colliding pairs)' % (collidesTime * 1e6 / pairs, collisions))
@@ -0,0 +1,56 @@
+'''
+Micro-benchmark of the car kinematics: times one heartbeat of accelerate
+and update for a crowd of cars, stepped one Car at a time and as a
+CarFleet (the --vectorCars path), for a few fleet sizes.
+
+    python benchmarkFleet.py -r 200
+'''
+
+from engine.model.car.car import Car
+from engine.model.car.fleet import CarFleet
+from engine.vector import Vec2d
+
+import optparse
+import random
+import time
+
+def makeCars(numCars, size):
+    cars = []
+    for _ in range(numCars):
+        pos = Vec2d(random.uniform(0, size), random.uniform(0, size))
+        car = Car(pos, random.choice(['north', 'south', 'east', 'west']), Vec2d(0, 0))
+        car.wheelAngle = random.uniform(-40, 40)
+        car.maxSpeed = random.gauss(Car.MAX_SPEED, 2.0)
+        cars.append(car)
+    return cars
+
+def timeCars(cars, repeats):
+    start = time.time()
+    for _ in range(repeats):
+        for car in cars:
+            car.accelerate(Car.MAX_ACCELERATION)
+            car.update()
+    return time.time() - start
+
+def timeFleet(cars, repeats):
+    fleet = CarFleet(cars)
+    start = time.time()
+    for _ in range(repeats):
+        for car in cars:
+            car.accelerate(Car.MAX_ACCELERATION)
+        fleet.update()
+    return time.time() - start
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser()
+    parser.add_option('-r', '--repeats', type='int', dest='repeats', default=200)
+    parser.add_option('-s', '--size', type='float', dest='size', default=1000.0)
+    (options, _) = parser.parse_args()
+
+    for numCars in [3, 10, 20, 50, 100, 1000]:
+        random.seed('benchmarkFleet')
+        carsTime = timeCars(makeCars(numCars, options.size), options.repeats)
+        random.seed('benchmarkFleet')
+        fleetTime = timeFleet(makeCars(numCars, options.size), options.repeats)
+        print('%5d cars: Car.update %8.1f us/heartbeat, CarFleet %8.1f us/heartbeat (%.2fx)' % (
+            numCars, carsTime * 1e6 / options.repeats, fleetTime * 1e6 / options.repeats, carsTime / fleetTime))
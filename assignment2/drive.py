@@ -27,6 +27,11 @@ if __name__ == '__main__':
     parser.add_option('-s', '--speed', dest='speed', default='verySlow')
     parser.add_option('-a', '--auto', dest='auto', default=False, action='store_true')
     parser.add_option('-f', '--fixedSeed', dest='fixedSeed', default=False, action='store_true')
+    parser.add_option('--headless', dest='headless', default=False, action='store_true')
+    parser.add_option('--vectorCars', dest='vectorCars', default=False, action='store_true')
+    parser.add_option('-n', '--iterations', type='int', dest='iterations', default=None)
+    parser.add_option('--particles', type='int', dest='particles', default=None)
+    parser.add_option('--aliasSampling', dest='aliasSampling', default=False, action='store_true')
     (options, _) = parser.parse_args()
     
     Const.WORLD = options.layout
@@ -38,6 +43,11 @@ if __name__ == '__main__':
     Const.HEARTBEATS_PER_SECOND = Const.HEARTBEAT_DICT[Const.SIM_SPEED]
     Const.SECONDS_PER_HEARTBEAT = 1.0 / Const.HEARTBEATS_PER_SECOND
     Const.AUTO = options.auto
+    Const.HEADLESS = options.headless
+    Const.VECTOR_CARS = options.vectorCars
+    Const.MAX_ITERATIONS = options.iterations
+    Const.NUM_PARTICLES = options.particles
+    Const.ALIAS_SAMPLING = options.aliasSampling
     
     signal.signal(signal.SIGINT, signal_handler)
 
@@ -46,7 +56,7 @@ if __name__ == '__main__':
 
     controller = Controller()
     quit = controller.drive()
-    if not quit:
+    if not quit and not Const.HEADLESS:
         controller.freezeFrame()
     
     print('closing...')
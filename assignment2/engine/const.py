@@ -2,7 +2,7 @@
 
 class Const(object):
     
-    INFERENCE_TYPES = ['none', 'particleFilter', 'exactInference']
+    INFERENCE_TYPES = ['none', 'particleFilter', 'exactInference', 'vectorParticleFilter']
     TITLE = "Driverless Car Simulator"
     SONAR_STD = 20.0
     
@@ -34,6 +34,22 @@ class Const(object):
     EPSILON = 0.0001
 
     WORLD = 'lombard'
+
+    # Headless runs have no graphics and step junior and the other cars in
+    # lock step as fast as possible instead of every SECONDS_PER_HEARTBEAT
+    HEADLESS = False
+    # Stop driving after this many heartbeats (None drives until the game ends)
+    MAX_ITERATIONS = None
+    # Move all the other cars in one NumPy step (see CarFleet) instead of
+    # calling Car.update on each of them. The step has a fixed cost of a few
+    # dozen array operations, so it only beats the per-car update from about
+    # 20 cars on (see benchmarkFleet.py) and is off by default.
+    VECTOR_CARS = False
+    # Particles per car of the particle filters (None keeps their default)
+    NUM_PARTICLES = None
+    # ParticleFilter draws its particles in batches from alias tables (see
+    # util.AliasSampler) instead of one weightedRandomChoice per particle
+    ALIAS_SAMPLING = False
     
 
     
@@ -2,6 +2,7 @@ from .model.model import Model
 from .const import Const
 from .view.display import Display
 from .model.layout import Layout
+from .model.car.fleet import CarFleet
 from .vector import Vec2d
 from .containers.counter import Counter
 from .userThread import UserThread
@@ -16,9 +17,12 @@ import traceback
 class Controller(object):
     
     def __init__(self):
+        if Const.VECTOR_CARS and not util.NUMPY_ENABLED:
+            raise Exception('VECTOR_CARS needs NumPy')
         self.layout = Layout(Const.WORLD)
         Display.initGraphics(self.layout)
         self.model = Model(self.layout)
+        self.fleet = CarFleet(self.model.getOtherCars()) if Const.VECTOR_CARS else None
         self.carChanges = {}
         self.errorCounter = Counter()
         self.consecutiveLate = 0
@@ -34,6 +38,8 @@ class Controller(object):
         return self.run()
         
     def run(self):
+        if Const.HEADLESS:
+            return self.runHeadless()
         self.render()
         self.userThread = UserThread(self.model.junior, self.model)
         self.userThread.start()
@@ -59,6 +65,44 @@ class Controller(object):
         self.userThread.join()
         return self.userThread.quit
         
+    # Function: Run Headless
+    # ----------------------
+    # The simulation loop without graphics, threads or sleeping: every
+    # heartbeat of the other cars follows the junior heartbeats the user
+    # thread would have made in the meantime, all in this thread, so a
+    # fixed seed gives the same run every time.
+    def runHeadless(self):
+        self.userThread = UserThread(self.model.junior, self.model)
+        juniorSteps = max(1, int(round(Const.SECONDS_PER_HEARTBEAT / Const.SECONDS_PER_UI_HEARTBEAT)))
+        self.iteration = 0
+        startTime = time.time()
+        while not self.isGameOver():
+            self.resetTimes()
+            self.printStats()
+            for _ in range(juniorSteps):
+                self.userThread.heartbeat()
+                if self.userThread.shouldStop(): break
+
+            self.otherCarUpdate()
+            self.calculateError()
+            self.iteration += 1
+        self.runTime = time.time() - startTime
+        if not self.userThread.quit and not self.isLearning:
+            self.outputHeadlessResult()
+        return self.userThread.quit
+
+    def outputHeadlessResult(self):
+        if self.userThread.hasCollided():
+            result = 'car crash'
+        elif self.userThread.victory:
+            result = 'win'
+        else:
+            result = 'stopped'
+        rate = self.iteration / max(self.runTime, 1e-9)
+        print('result: %s after %d heartbeats (%.2fs, %.0f heartbeats/s)' % (result, self.iteration, self.runTime, rate))
+        if self.errorCounter.count > 0:
+            print('error: ' + str(self.errorCounter.getMean() * Const.BELIEF_TILE_SIZE))
+
     def freezeFrame(self):
         while True:
             keys = Display.getKeys()
@@ -87,6 +131,8 @@ class Controller(object):
             return self.iteration > Const.TRAIN_ITERATIONS
         if self.userThread.quit:
             return True
+        if Const.MAX_ITERATIONS is not None and self.iteration >= Const.MAX_ITERATIONS:
+            return True
         if self.userThread.victory:
             return True
         return self.userThread.hasCollided()
@@ -137,7 +183,11 @@ class Controller(object):
         if True or Const.INFERENCE != 'none':
             self.infer()
         self.act()
-        self.move(self.model.getOtherCars())
+        if self.fleet is not None:
+            self.moveFleet(self.model.getOtherCars())
+        else:
+            self.move(self.model.getOtherCars())
+        self.model.updateCarIndex()
         
     def observe(self):
         if self.isLearning: return
@@ -197,16 +247,33 @@ class Controller(object):
             oldDir = Vec2d(car.dir.x, car.dir.y)
             oldPos = Vec2d(car.pos.x, car.pos.y)
             car.update()
-            newPos = car.getPos()
-            newDir = car.getDir()
-            deltaPos = newPos - oldPos
-            deltaAngle = oldDir.get_angle_between(newDir)
             self.updateTime += time.time() - start
-            if Const.SHOW_CARS or car.isJunior():
-                self.moveCarDisplay(car, deltaPos, deltaAngle)
-            
-            if self.isLearning:
-                self.learner.noteCarMove(oldPos, newPos)
+            self.noteCarMove(car, oldPos, oldDir)
+
+    # Function: Move Fleet
+    # --------------------
+    # Like move, but the cars (all of them Agents) take their step together
+    # in self.fleet, which holds them since the controller was built.
+    # Agent.update does nothing while the cars are parked.
+    def moveFleet(self, cars):
+        start = time.time()
+        oldDirs = [Vec2d(car.dir.x, car.dir.y) for car in cars]
+        oldPositions = [Vec2d(car.pos.x, car.pos.y) for car in cars]
+        if not Const.CARS_PARKED:
+            self.fleet.update()
+        self.updateTime += time.time() - start
+        for car, oldPos, oldDir in zip(cars, oldPositions, oldDirs):
+            self.noteCarMove(car, oldPos, oldDir)
+
+    def noteCarMove(self, car, oldPos, oldDir):
+        newPos = car.getPos()
+        deltaPos = newPos - oldPos
+        deltaAngle = oldDir.get_angle_between(car.getDir())
+        if Const.SHOW_CARS or car.isJunior():
+            self.moveCarDisplay(car, deltaPos, deltaAngle)
+
+        if self.isLearning:
+            self.learner.noteCarMove(oldPos, newPos)
             
     def calculateError(self):
         if self.isLearning: return
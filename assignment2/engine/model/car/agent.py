@@ -6,9 +6,10 @@ Created on Jun 11, 2013
 from engine.model.car.car import Car
 from engine.view.display import Display
 from engine.vector import Vec2d
-from submission import ParticleFilter, ExactInference
+from submission import ParticleFilter, ExactInference, VectorParticleFilter
 from none import NoInference
 from engine.const import Const
+import util
 import random
 
 class Agent(Car):
@@ -53,16 +54,15 @@ class Agent(Car):
         newBounds = []
         offset = self.dir.normalized() * 1.5 * Car.LENGTH
         for bound in self.getBounds():
-            bound += offset
-            newBounds.append(bound)
+            newBounds.append(bound + offset)
         newPos = self.pos + offset
-        for agent in self.agentComm.getAgents():
+        for agent in self.model.getNearbyOtherCars(newPos.x, newPos.y):
             if agent.collides(newPos, newBounds): return True
         return False
 
     def driveToGoal(self):
         if self.isCloseToOtherCar():
-            self.velocity = Vec2d(0, 0)
+            self.stop()
             self.agentComm.unclaimIntersection(self)
             return
         
@@ -82,7 +82,7 @@ class Agent(Car):
                 self.inIntersection = False
         else:
             if self.model.inIntersection(frontOfCar.x, frontOfCar.y):
-                self.velocity = Vec2d(0, 0)
+                self.stop()
                 self.agentComm.unclaimIntersection(self)
                 self.inIntersection = True
             else:
@@ -129,9 +129,13 @@ class Agent(Car):
             rows = self.model.getBeliefRows()
             cols = self.model.getBeliefCols()
             if Const.INFERENCE == 'particleFilter':
-                self.inference = ParticleFilter(rows, cols)
+                self.inference = ParticleFilter(rows, cols, Const.NUM_PARTICLES, Const.ALIAS_SAMPLING)
+            elif Const.INFERENCE == 'vectorParticleFilter':
+                if not util.NUMPY_ENABLED:
+                    raise Exception('vectorParticleFilter needs NumPy')
+                self.inference = VectorParticleFilter(rows, cols, Const.NUM_PARTICLES)
             elif Const.INFERENCE == 'exactInference':
-                self.inference = ExactInference(rows, cols)
+                self.inference = ExactInference(rows, cols, useNumpy = util.NUMPY_ENABLED)
             elif Const.INFERENCE == 'none':
                 self.inference = NoInference(rows, cols)
             else:
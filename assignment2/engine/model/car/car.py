@@ -20,6 +20,9 @@ class Car(object):
     LENGTH = 30.0
     WIDTH = 15.0 
     RADIUS = math.sqrt(LENGTH ** 2 + WIDTH ** 2)
+
+    # The CarFleet moving the car, if any (see joinFleet)
+    fleet = None
     
     def __init__(self, pos, dirName, velocity):
         self.initialPos = Vec2d(pos.x, pos.y)
@@ -31,6 +34,8 @@ class Car(object):
         self.maxSpeed = Car.MAX_SPEED
         self.friction = Car.FRICTION
         self.maxWheelAngle = Car.MAX_WHEEL_ANGLE
+        self.boundsVersion = 0
+        self.invalidateBounds()
         
     def getPos(self):
         return self.pos
@@ -67,6 +72,7 @@ class Car(object):
         self.pos += self.velocity
         self.turnWheelsTowardsStraight()
         self.applyFriction()
+        self.invalidateBounds()
     
     def turnWheelsTowardsStraight(self):
         if self.wheelAngle < 0:
@@ -92,11 +98,14 @@ class Car(object):
         self.decellerate(self.friction)
         
     def setWheelAngle(self, angle):
-        self.wheelAngle = angle
-        if self.wheelAngle <= -self.maxWheelAngle:
-            self.wheelAngle= -self.maxWheelAngle
-        if self.wheelAngle >= self.maxWheelAngle:
-            self.wheelAngle = self.maxWheelAngle
+        if angle <= -self.maxWheelAngle:
+            angle = -self.maxWheelAngle
+        if angle >= self.maxWheelAngle:
+            angle = self.maxWheelAngle
+        if self.fleet is not None:
+            self.fleet.setWheelAngle(self.fleetIndex, angle)
+        else:
+            self.wheelAngle = angle
         
     def turnLeft(self, amount):
         self.wheelAngle -= amount
@@ -109,46 +118,115 @@ class Car(object):
             self.wheelAngle = self.maxWheelAngle
     
     def accelerate(self, amount):
+        if self.fleet is not None:
+            return self.fleet.accelerate(self.fleetIndex, amount)
         amount = min(amount, Car.MAX_ACCELERATION)
         acceleration = Vec2d(self.dir.x, self.dir.y).normalized()
         acceleration *= amount
         self.velocity += acceleration
         if (self.velocity.get_length() >= self.maxSpeed):
             self.velocity.set_length(self.maxSpeed)
+
+
+    def stop(self):
+        if self.fleet is not None:
+            self.fleet.stop(self.fleetIndex)
+        else:
+            self.velocity = Vec2d(0, 0)
+
+    # Function: Join Fleet
+    # --------------------
+    # Hands the kinematic state of the car over to a CarFleet, which moves
+    # it from then on (Car.update must not be called any more). The car
+    # keeps its pos and dir, which the fleet writes back after every step,
+    # while velocity and wheelAngle are read from the fleet (see
+    # __getattr__) and must only be changed through accelerate, stop and
+    # setWheelAngle.
+    def joinFleet(self, fleet, index):
+        self.fleet = fleet
+        self.fleetIndex = index
+        del self.velocity
+        del self.wheelAngle
+
+    # Only called for attributes the car does not have.
+    def __getattr__(self, name):
+        fleet = self.__dict__.get('fleet')
+        if fleet is not None:
+            if name == 'velocity': return fleet.getVelocity(self.fleetIndex)
+            if name == 'wheelAngle': return fleet.getWheelAngle(self.fleetIndex)
+        raise AttributeError(name)
            
     # http://www.gamedev.net/page/resources/_/technical/game-programming/2d-rotated-rectangle-collision-r2604 
     def collides(self, otherPos, otherBounds):
-        diff = otherPos - self.pos
-        dist = diff.get_length()
+        dx = otherPos.x - self.pos.x
+        dy = otherPos.y - self.pos.y
+        dist = math.sqrt(dx ** 2 + dy ** 2)
         if dist > Car.RADIUS * 2: return False
         
         bounds = self.getBounds()
-        vec1 = bounds[0] - bounds[1]
+        for (vec, minA, maxA) in self.getAxes():
+            (minB, maxB) = Vec2d.projectPoints(otherBounds, vec)
+            if not Car.overlaps(minA, maxA, minB, maxB): return False
         vec2 = otherBounds[0] - otherBounds[1]
-        axis = [
-            vec1,
-            vec1.perpendicular(),
-            vec2,
-            vec2.perpendicular()
-        ]
-        for vec in axis:
+        for vec in [vec2, vec2.perpendicular()]:
             (minA, maxA) = Vec2d.projectPoints(bounds, vec)
             (minB, maxB) = Vec2d.projectPoints(otherBounds, vec)
-            leftmostA = minA <= minB
-            overlap = False
-            if leftmostA and maxA >= minB: overlap = True
-            if not leftmostA and maxB >= minA: overlap = True
-            if not overlap: return False
+            if not Car.overlaps(minA, maxA, minB, maxB): return False
         return True
-            
+
+    @staticmethod
+    def overlaps(minA, maxA, minB, maxB):
+        leftmostA = minA <= minB
+        if leftmostA and maxA >= minB: return True
+        if not leftmostA and maxB >= minA: return True
+        return False
+
+    # The bounds only change when the car moves, so they (and the axes
+    # below) are kept until update() drops them. Callers must not modify
+    # the returned points. The controller thread can move the car while
+    # another thread is filling the cache, so each entry is tagged with the
+    # version of the car it was computed from and only used while that is
+    # still the current version.
     def getBounds(self):
+        version = self.boundsVersion
+        cache = self.boundsCache
+        if cache is not None and cache[0] == version:
+            return cache[1]
+        bounds = self.computeBounds()
+        self.boundsCache = (version, bounds)
+        return bounds
+
+    # The two edge directions of the car, which are separating axes for
+    # collides, each with the extent of the bounds projected on it.
+    def getAxes(self):
+        version = self.boundsVersion
+        cache = self.axesCache
+        if cache is not None and cache[0] == version:
+            return cache[1]
+        bounds = self.getBounds()
+        edge = bounds[0] - bounds[1]
+        axes = []
+        for vec in [edge, edge.perpendicular()]:
+            (low, high) = Vec2d.projectPoints(bounds, vec)
+            axes.append((vec, low, high))
+        self.axesCache = (version, axes)
+        return axes
+
+    def invalidateBounds(self):
+        self.boundsVersion += 1
+        self.boundsCache = None
+        self.axesCache = None
+
+    def computeBounds(self):
         normalDir = self.dir.normalized()
         perpDir = normalDir.perpendicular()
+        front = Vec2d(self.pos.x, self.pos.y).add_scaled(normalDir, Car.LENGTH / 2)
+        back = Vec2d(self.pos.x, self.pos.y).add_scaled(normalDir, -Car.LENGTH / 2)
         bounds = [
-            self.pos + normalDir * Car.LENGTH / 2 + perpDir * Car.WIDTH / 2,
-            self.pos + normalDir * Car.LENGTH / 2 - perpDir * Car.WIDTH / 2,
-            self.pos - normalDir * Car.LENGTH / 2 + perpDir * Car.WIDTH / 2,
-            self.pos - normalDir * Car.LENGTH / 2 - perpDir * Car.WIDTH / 2
+            Vec2d(front.x, front.y).add_scaled(perpDir, Car.WIDTH / 2),
+            front.add_scaled(perpDir, -Car.WIDTH / 2),
+            Vec2d(back.x, back.y).add_scaled(perpDir, Car.WIDTH / 2),
+            back.add_scaled(perpDir, -Car.WIDTH / 2)
         ]
         return bounds
             
@@ -0,0 +1,155 @@
+from engine.vector import Vec2d
+from engine.model.car.car import Car
+
+import util
+
+if util.NUMPY_ENABLED:
+    import numpy as np
+
+# The kinematic state of a list of cars as one array per field, so that
+# Car.accelerate and Car.update can be done for all of them with a handful
+# of NumPy operations. The fleet is built once and keeps the state from
+# then on: the cars send their accelerate, stop and setWheelAngle calls to
+# it and read their velocity and wheel angle from it (see Car.joinFleet).
+# Only the positions and directions, which the rest of the simulator reads
+# every heartbeat, are written back to the cars after each step. The
+# arithmetic is done in the same order as in Car, which keeps the
+# trajectories identical to stepping the cars one by one.
+class CarFleet(object):
+
+    def __init__(self, cars):
+        self.cars = cars
+        self.posX = np.array([car.pos.x for car in cars], dtype = float)
+        self.posY = np.array([car.pos.y for car in cars], dtype = float)
+        self.velX = np.array([car.velocity.x for car in cars], dtype = float)
+        self.velY = np.array([car.velocity.y for car in cars], dtype = float)
+        self.dirX = np.array([car.dir.x for car in cars], dtype = float)
+        self.dirY = np.array([car.dir.y for car in cars], dtype = float)
+        self.wheelAngle = np.array([car.wheelAngle for car in cars], dtype = float)
+        self.friction = np.array([car.friction for car in cars], dtype = float)
+        self.maxSpeed = np.array([car.maxSpeed for car in cars], dtype = float)
+        # The accelerate calls made since the last step
+        self.acceleration = np.zeros(len(cars))
+        self.accelerating = np.zeros(len(cars), dtype = bool)
+        for (index, car) in enumerate(cars):
+            car.joinFleet(self, index)
+
+    def getVelocity(self, index):
+        return Vec2d(float(self.velX[index]), float(self.velY[index]))
+
+    def getWheelAngle(self, index):
+        return float(self.wheelAngle[index])
+
+    def setWheelAngle(self, index, angle):
+        self.wheelAngle[index] = angle
+
+    # Function: Accelerate
+    # --------------------
+    # Car.accelerate for one car, applied with the others at the start of
+    # the next step. A car accelerates at most once per heartbeat.
+    def accelerate(self, index, amount):
+        self.acceleration[index] = min(amount, Car.MAX_ACCELERATION)
+        self.accelerating[index] = True
+
+    def stop(self, index):
+        self.velX[index] = 0.0
+        self.velY[index] = 0.0
+        self.accelerating[index] = False
+
+    # Function: Update
+    # ----------------
+    # The pending accelerations followed by Car.update for every car of
+    # the fleet.
+    def update(self):
+        self.applyAcceleration()
+        moving = self.turnCarsTowardsWheels()
+        self.posX += self.velX
+        self.posY += self.velY
+        self.turnWheelsTowardsStraight()
+        self.applyFriction()
+        self.scatter(moving)
+
+    # Function: Apply Acceleration
+    # ----------------------------
+    # Adds the pending accelerations along the direction of each car and
+    # caps the speed at its maxSpeed.
+    def applyAcceleration(self):
+        accelerating = self.accelerating
+        if not accelerating.any(): return
+        length = np.sqrt(self.dirX * self.dirX + self.dirY * self.dirY)
+        turned = length != 0
+        length[~turned] = 1.0
+        velX = self.velX + self.dirX / length * self.acceleration
+        velY = self.velY + self.dirY / length * self.acceleration
+        speed = np.sqrt(velX * velX + velY * velY)
+        capped = speed >= self.maxSpeed
+        speed[~capped] = 1.0
+        scale = np.where(capped, self.maxSpeed / speed, 1.0)
+        velX = np.where(capped, velX * scale, velX)
+        velY = np.where(capped, velY * scale, velY)
+        self.velX = np.where(accelerating, velX, self.velX)
+        self.velY = np.where(accelerating, velY, self.velY)
+        accelerating[:] = False
+
+    # Function: Turn Cars Towards Wheels
+    # ----------------------------------
+    # Rotates the velocity of the moving cars by their wheel angle and
+    # points them along it. Returns the mask of the moving cars.
+    def turnCarsTowardsWheels(self):
+        moving = self.velX * self.velX + self.velY * self.velY > 0.0
+        radians = np.radians(self.wheelAngle)
+        cos = np.cos(radians)
+        sin = np.sin(radians)
+        x = self.velX * cos - self.velY * sin
+        y = self.velX * sin + self.velY * cos
+        self.velX = np.where(moving, x, self.velX)
+        self.velY = np.where(moving, y, self.velY)
+        self.dirX = np.where(moving, x, self.dirX)
+        self.dirY = np.where(moving, y, self.dirY)
+        return moving
+
+    # Function: Turn Wheels Towards Straight
+    # --------------------------------------
+    # Turns every wheel 0.7 degrees back towards straight ahead.
+    def turnWheelsTowardsStraight(self):
+        angle = self.wheelAngle
+        self.wheelAngle = np.where(
+            angle < 0, np.minimum(angle + 0.7, 0.0),
+            np.where(angle > 0, np.maximum(angle - 0.7, 0.0), angle)
+        )
+
+    # Function: Apply Friction
+    # ------------------------
+    # Car.decellerate by the friction of each moving car, which stops once
+    # friction turns it around.
+    def applyFriction(self):
+        speed = np.sqrt(self.velX * self.velX + self.velY * self.velY)
+        slowed = speed != 0
+        speed[~slowed] = 1.0
+        frictionX = -self.velX / speed * self.friction
+        frictionY = -self.velY / speed * self.friction
+        velX = self.velX + frictionX
+        velY = self.velY + frictionY
+        angle = np.degrees(np.arctan2(velX * frictionY - velY * frictionX, velX * frictionX + velY * frictionY))
+        stopped = slowed & (np.abs(angle) < 180)
+        self.velX = np.where(stopped, 0.0, np.where(slowed, velX, self.velX))
+        self.velY = np.where(stopped, 0.0, np.where(slowed, velY, self.velY))
+
+    # Function: Scatter
+    # -----------------
+    # Writes the new position and direction of the cars that moved back to
+    # them, the position in place and the direction as a new vector, like
+    # Car.update does.
+    def scatter(self, moving):
+        cars = self.cars
+        indices = np.flatnonzero(moving)
+        state = zip(
+            indices.tolist(), self.posX[indices].tolist(), self.posY[indices].tolist(),
+            self.dirX[indices].tolist(), self.dirY[indices].tolist()
+        )
+        for (index, x, y, dx, dy) in state:
+            car = cars[index]
+            car.pos.x = x
+            car.pos.y = y
+            car.dir = Vec2d(dx, dy)
+            car.invalidateBounds()
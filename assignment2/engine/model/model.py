@@ -6,13 +6,20 @@ from engine.vector import Vec2d
 from engine.const import Const
 from engine.model.block import Block
 from engine.model.agentCommunication import AgentCommunication
+from engine.model.spatialIndex import BlockIndex, CarIndex
 
-import threading
-import copy
 import util
 
+if util.NUMPY_ENABLED:
+    import numpy as np
+
 class Model(object):
 
+    # Blocks and intersections are laid out on multiples of BLOCK_TILE_SIZE
+    BLOCK_CELL_SIZE = 2 * Const.BLOCK_TILE_SIZE
+    # Cars closer than this can collide (see Car.collides)
+    CAR_CELL_SIZE = 2 * Car.RADIUS
+
     def __init__(self, layout):
         self._initBlocks(layout)
         self._initIntersections(layout)
@@ -39,20 +46,25 @@ class Model(object):
             self.otherCars.append(other)
         self.observations = []
         agentComm.addAgents(self.otherCars)
-        self.modelLock = threading.Lock()
-        self.probCarSet = False
+        # The furthest a car can travel in one heartbeat: accelerate never
+        # lets its speed go past its maxSpeed
+        self.maxCarStep = max([abs(car.maxSpeed) for car in self.otherCars] + [0.0])
+        self.updateCarIndex()
+        self.probCar = None
         
     def _initBlocks(self, layout):
         self.blocks = []
         for blockData in layout.getBlockData():
             block = Block(blockData)
             self.blocks.append(block)
+        self.blockIndex = BlockIndex(self.blocks, Model.BLOCK_CELL_SIZE)
             
     def _initIntersections(self, layout):
         self.intersections = []
         for blockData in layout.getIntersectionNodes():
             block = Block(blockData)
             self.intersections.append(block)
+        self.intersectionIndex = BlockIndex(self.intersections, Model.BLOCK_CELL_SIZE)
             
     def _getStartNode(self, agentGraph):
         while True:
@@ -79,15 +91,29 @@ class Model(object):
             if not self.inBounds(point.x, point.y): return True
         
         # check for collision with other cars
-        for other in self.cars:
+        pos = car.getPos()
+        for other in self.getNearbyCars(pos.x, pos.y):
             if other == car: continue
-            if other.collides(car.getPos(), bounds): return True
+            if other.collides(pos, bounds): return True
         return False
+
+    # The other cars only move in the controller heartbeat, which rebuilds
+    # their index afterwards. In the threaded GUI the user thread can look
+    # cars up while the heartbeat is moving them, with each car up to one
+    # step away from where it was indexed, so the cells are widened by
+    # maxCarStep. Junior moves in between, so it is not indexed and is
+    # always returned.
+    def updateCarIndex(self):
+        self.carIndex = CarIndex(self.otherCars, Model.CAR_CELL_SIZE + self.maxCarStep)
+
+    def getNearbyOtherCars(self, x, y):
+        return self.carIndex.getNearbyCars(x, y)
+
+    def getNearbyCars(self, x, y):
+        return self.getNearbyOtherCars(x, y) + [self.junior]
         
     def getIntersection(self, x, y):
-        for intersection in self.intersections:
-            if intersection.containsPoint(x, y): return intersection
-        return None
+        return self.intersectionIndex.getBlock(x, y)
         
     def inIntersection(self, x, y):
         return self.getIntersection(x, y) != None
@@ -95,9 +121,7 @@ class Model(object):
     def inBounds(self, x, y):
         if x < 0 or x >= self.getWidth(): return False
         if y < 0 or y >= self.getHeight(): return False
-        for block in self.blocks:
-            if block.containsPoint(x, y): return False
-        return True
+        return self.blockIndex.getBlock(x, y) == None
     
     def getWidth(self):
         return self.layout.getWidth()
@@ -132,8 +156,14 @@ class Model(object):
     def getJuniorGraph(self):
         return self.layout.getJuniorGraph()
     
+    # The probability that some car is on each tile (a noisy-or over the
+    # beliefs of the cars). Every call builds a new Belief and only then
+    # swaps it in, so the user thread can read the published one without
+    # locking or copying it. With NumPy it is a read-only ArrayBelief.
     def setProbCar(self, beliefs):
-        self.modelLock.acquire()
+        if util.NUMPY_ENABLED:
+            self.probCar = self.noisyOrArray(beliefs)
+            return
         total = util.Belief(self.getBeliefRows(), self.getBeliefCols(), 0.0)
         for r in range(self.getBeliefRows()):
             for c in range(self.getBeliefCols()):
@@ -144,12 +174,17 @@ class Model(object):
                 p = 1.0 - pNot
                 total.setProb(r, c, p)
         self.probCar = total
-        self.modelLock.release()
-        self.probCarSet = True
+
+    def noisyOrArray(self, beliefs):
+        rows = self.getBeliefRows()
+        cols = self.getBeliefCols()
+        grids = np.empty((len(beliefs), rows, cols))
+        for i, b in enumerate(beliefs):
+            grids[i] = b.grid
+        total = util.ArrayBelief(rows, cols, 0.0)
+        total.grid = 1.0 - np.prod(1.0 - grids, axis = 0)
+        total.grid.flags.writeable = False
+        return total
     
     def getProbCar(self):
-        if not self.probCarSet: return None
-        self.modelLock.acquire()
-        probCar = copy.deepcopy(self.probCar)
-        self.modelLock.release()
-        return probCar
\ No newline at end of file
+        return self.probCar
\ No newline at end of file
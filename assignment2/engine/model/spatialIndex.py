@@ -0,0 +1,64 @@
+import math
+
+# Uniform grids that bucket the blocks, intersections and cars of a Model,
+# so that a point or car only has to be checked against what is near it
+# instead of against everything in the world.
+
+class BlockIndex(object):
+
+    # Every block is put in each cell its rectangle touches (edges
+    # included, like Block.containsPoint) and keeps its order in the list
+    # it was built from, so getBlock finds the same block a linear scan
+    # would.
+    def __init__(self, blocks, cellSize):
+        self.cellSize = float(cellSize)
+        self.cells = {}
+        for block in blocks:
+            colStart = self._cellOf(min(block.x1, block.x2))
+            colEnd = self._cellOf(max(block.x1, block.x2))
+            rowStart = self._cellOf(min(block.y1, block.y2))
+            rowEnd = self._cellOf(max(block.y1, block.y2))
+            for col in range(colStart, colEnd + 1):
+                for row in range(rowStart, rowEnd + 1):
+                    self.cells.setdefault((col, row), []).append(block)
+
+    def _cellOf(self, value):
+        return int(math.floor(value / self.cellSize))
+
+    def getBlocks(self, x, y):
+        return self.cells.get((self._cellOf(x), self._cellOf(y)), ())
+
+    def getBlock(self, x, y):
+        for block in self.getBlocks(x, y):
+            if block.containsPoint(x, y): return block
+        return None
+
+
+class CarIndex(object):
+
+    # Cars are bucketed by the cell of their position when the index is
+    # built. Two cars can only collide when their centers are at most
+    # 2 * Car.RADIUS apart, so with cells at least that big the 3x3 cells
+    # around a point hold every car that can touch a car at that point. A
+    # car that may have moved since the index was built needs cells wider
+    # by the distance it can have covered (see Model.updateCarIndex).
+    def __init__(self, cars, cellSize):
+        self.cellSize = float(cellSize)
+        self.cells = {}
+        for car in cars:
+            pos = car.getPos()
+            cell = (self._cellOf(pos.x), self._cellOf(pos.y))
+            self.cells.setdefault(cell, []).append(car)
+
+    def _cellOf(self, value):
+        return int(math.floor(value / self.cellSize))
+
+    def getNearbyCars(self, x, y):
+        col = self._cellOf(x)
+        row = self._cellOf(y)
+        nearby = []
+        for c in (col - 1, col, col + 1):
+            for r in (row - 1, row, row + 1):
+                cars = self.cells.get((c, r))
+                if cars: nearby.extend(cars)
+        return nearby
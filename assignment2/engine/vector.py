@@ -24,7 +24,7 @@ class Vec2d(object):
     __slots__ = ["x", "y"]
 
     def __init__(self, x_or_pair, y=None):
-        if y == None:
+        if y is None:
             self.x = x_or_pair[0]
             self.y = x_or_pair[1]
         else:
@@ -192,6 +192,8 @@ class Vec2d(object):
         return self._io(other, operator.floordiv)
 
     def __truediv__(self, other):
+        if isinstance(other, (int, float)):
+            return Vec2d(self.x / other, self.y / other)
         return self._o2(other, operator.truediv)
 
     def __rtruediv__(self, other):
@@ -252,11 +254,14 @@ class Vec2d(object):
     def get_reflection(self):
         return Vec2d(-self.x, -self.y)
 
+    # Lengths square with x * x rather than x ** 2, which goes through the C
+    # library pow and can be an ulp off, so that CarFleet can take the same
+    # lengths for a whole array of vectors at once.
     def get_length_sqrd(self):
-        return self.x ** 2 + self.y ** 2
+        return self.x * self.x + self.y * self.y
 
     def get_length(self):
-        return math.sqrt(self.x ** 2 + self.y ** 2)
+        return math.sqrt(self.x * self.x + self.y * self.y)
 
     def __setlength(self, value):
         length = self.get_length()
@@ -305,10 +310,10 @@ class Vec2d(object):
         return math.degrees(math.atan2(cross, dot))
 
     def normalized(self):
-        length = self.length
+        length = math.sqrt(self.x * self.x + self.y * self.y)
         if length != 0:
-            return self / length
-        return Vec2d(self)
+            return Vec2d(self.x / length, self.y / length)
+        return Vec2d(self.x, self.y)
 
     def normalize_return_length(self):
         length = self.length
@@ -327,8 +332,16 @@ class Vec2d(object):
         return Vec2d(self)
 
     def dot(self, other):
+        if isinstance(other, Vec2d):
+            return float(self.x * other.x + self.y * other.y)
         return float(self.x * other[0] + self.y * other[1])
 
+    # Fused in-place self += other * scale, without the temporary Vec2d
+    def add_scaled(self, other, scale):
+        self.x += other.x * scale
+        self.y += other.y * scale
+        return self
+
     def get_distance(self, other):
         return math.sqrt((self.x - other[0]) ** 2 + (self.y - other[1]) ** 2)
 
@@ -366,8 +379,8 @@ class Vec2d(object):
 
     @staticmethod
     def projectPoints(points, vector):
-        values = []
-        for point in points:
-            value = Vec2d.project(point, vector)
-            values.append(value)
+        x = vector.x
+        y = vector.y
+        length = vector.dot(vector)
+        values = [float(point.x * x + point.y * y) / length for point in points]
         return (min(values), max(values))
@@ -7,6 +7,10 @@ import colorsys
 import threading
 
 class Display(object):
+    """
+    Draws the simulation with graphicsUtils. With Const.HEADLESS every
+    call does nothing (and getKeys reports no keys).
+    """
     
     WHITE = graphicsUtils.formatColor(1.0, 1.0, 1.0)
     RED = graphicsUtils.formatColor(1.0, 0.0, 0.0)
@@ -45,6 +49,7 @@ class Display(object):
     
     @staticmethod
     def initGraphics(layout):
+        if Const.HEADLESS: return
         graphicsUtils.begin_graphics(
             width=layout.getWidth(), 
             height=layout.getHeight(), 
@@ -54,14 +59,17 @@ class Display(object):
         
     @staticmethod
     def endGraphics():
+        if Const.HEADLESS: return
         graphicsUtils.end_graphics()
 
     @staticmethod
     def raiseEndGraphics():
+        if Const.HEADLESS: return
         graphicsUtils.raiseEndGraphics()
     
     @staticmethod
     def drawCar(car):
+        if Const.HEADLESS: return
         if car in Display.partDict:
             Display._remove(car)
         color = Display.GREY
@@ -86,6 +94,7 @@ class Display(object):
     
     @staticmethod
     def drawFinish(block):
+        if Const.HEADLESS: return
         graphicsUtils.rectangle(
                 block.getCenter(), 
                 block.getHeight(), 
@@ -97,6 +106,7 @@ class Display(object):
     
     @staticmethod
     def drawBlocks(blocks):
+        if Const.HEADLESS: return
         for block in blocks:
             graphicsUtils.rectangle(
                 block.getCenter(), 
@@ -113,6 +123,7 @@ class Display(object):
     
     @staticmethod
     def drawBelief(model):
+        if Const.HEADLESS: return
         Display.beliefVisible = []
         for r in range(model.getBeliefRows()):
             beliefValueRow = []
@@ -139,6 +150,7 @@ class Display(object):
     # make thread safe
     @staticmethod
     def getKeys():
+        if Const.HEADLESS: return []
         #print 'attempt get keys'
         Display._acquireLock()
         #print 'get keys'
@@ -149,6 +161,7 @@ class Display(object):
     # make thread safe
     @staticmethod
     def graphicsSleep(timeToSleep):
+        if Const.HEADLESS: return
         graphicsUtils.sleep(timeToSleep)
         #time.sleep(timeToSleep)
         '''for _ in range(int(timeToSleep / 0.005)):
@@ -172,6 +185,7 @@ class Display(object):
     # make thread safe
     @staticmethod
     def updateBelief(color, belief):
+        if Const.HEADLESS: return
         Display._acquireLock()
         total = belief.getSum()
         if abs(total - 1.0) > 0.001:
@@ -185,6 +199,7 @@ class Display(object):
     # make thread safe
     @staticmethod
     def move(obj, delta):
+        if Const.HEADLESS: return
         #print 'attempt move'
         Display._acquireLock()
         #print 'move'
@@ -197,7 +212,7 @@ class Display(object):
     # make thread safe
     @staticmethod
     def rotate(obj, angle):
-        if angle == 0: return
+        if angle == 0 or Const.HEADLESS: return
         #print 'attempt rotate'
         Display._acquireLock()
         #print 'rotate'
@@ -11,11 +11,27 @@ from engine.view.display import Display
 from learner import Learner
 import os.path
 import optparse
+import util
 import signal
+import random
 
 def signal_handler(signal, frame):
     Display.raiseEndGraphics()
 
+# Function: Learn Episode
+# -----------------------
+# Runs one headless training episode in a worker process: applies the Const
+# settings, seeds the random module and returns a Learner holding the
+# transition counts of this episode alone.
+def learnEpisode(job):
+    settings, seed = job
+    for name, value in settings.items():
+        setattr(Const, name, value)
+    random.seed(seed)
+    learner = Learner()
+    Controller().learn(learner)
+    return learner
+
 def run():
     parser = optparse.OptionParser()
     parser.add_option('-p', '--parked', dest='parked', default=False, action='store_true')
@@ -25,6 +41,9 @@ def run():
     parser.add_option('-s', '--speed', dest='speed', default='slow')
     parser.add_option('-f', '--fixedSeed', dest='fixedSeed', default=False, action='store_true')
     parser.add_option('-a', '--auto', dest='auto', default=False, action='store_true')
+    parser.add_option('--headless', dest='headless', default=False, action='store_true')
+    parser.add_option('--vectorCars', dest='vectorCars', default=False, action='store_true')
+    parser.add_option('-w', '--workers', type='int', dest='workers', default=1)
     (options, _) = parser.parse_args()
     
     Const.WORLD = options.layout
@@ -33,6 +52,8 @@ def run():
     Const.NUM_AGENTS = options.numCars
     Const.INFERENCE = 'none'
     Const.AUTO = options.auto
+    Const.HEADLESS = options.headless
+    Const.VECTOR_CARS = options.vectorCars
     Const.SECONDS_PER_HEARTBEAT = 0.001
 
     signal.signal(signal.SIGINT, signal_handler)
@@ -41,6 +62,11 @@ def run():
     if options.fixedSeed: random.seed('driverlessCar')
     
     learner = Learner()
+
+    if options.workers > 1:
+        learnParallel(learner, options)
+        saveLearner(learner)
+        return
     
     iterations = 0
     numIter = Const.TRAIN_MAX_AGENTS * Const.TRAIN_PER_AGENT_COUNT
@@ -54,13 +80,54 @@ def run():
                 Display.endGraphics()
                 return
             iterations += 1
-    
+
+    saveLearner(learner)
+    Display.endGraphics()
+
+# Function: Learn Parallel
+# ------------------------
+# Runs the training episodes headless on a pool of options.workers
+# processes, each with its own seed, and merges their transition counts
+# into learner in episode order (so a fixed seed gives the same file).
+def learnParallel(learner, options):
+    import multiprocessing
+    settings = {
+        'WORLD': Const.WORLD,
+        'CARS_PARKED': Const.CARS_PARKED,
+        'SHOW_CARS': Const.SHOW_CARS,
+        'AUTO': Const.AUTO,
+        'INFERENCE': 'none',
+        'HEADLESS': True,
+        'SECONDS_PER_HEARTBEAT': Const.SECONDS_PER_HEARTBEAT,
+        'VECTOR_CARS': Const.VECTOR_CARS,
+    }
+    jobs = []
+    for i in range(1, Const.TRAIN_MAX_AGENTS + 1):
+        for j in range(Const.TRAIN_PER_AGENT_COUNT):
+            seed = 'driverlessCar-%d' % len(jobs) if options.fixedSeed else random.getrandbits(64)
+            jobs.append((dict(settings, NUM_AGENTS = i), seed))
+
+    pool = multiprocessing.Pool(options.workers)
+    try:
+        for done, episodeLearner in enumerate(pool.imap(learnEpisode, jobs)):
+            learner.merge(episodeLearner)
+            print(str(int((done + 1) * 100.0 / len(jobs))) + '% done')
+    finally:
+        pool.close()
+        pool.join()
+
+# Function: Save Learner
+# ----------------------
+# Writes the transition probabilities of learner for the current world.
+def saveLearner(learner):
     transFileName = Const.WORLD + 'TransProb.p'
     transFilePath = os.path.join('learned', transFileName)
+    sparsePath = os.path.join('learned', Const.WORLD + 'TransProb.npz') if util.NUMPY_ENABLED else None
     with open(transFilePath, 'wb') as transFile:
-        learner.saveTransitionProb(transFile)
+        learner.saveTransitionProb(transFile, sparsePath)
         print('saved file: ' + transFilePath)
-    Display.endGraphics()
+    if sparsePath is not None:
+        print('saved file: ' + sparsePath)
 
 if __name__ == '__main__':
     run()
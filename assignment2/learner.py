@@ -34,13 +34,25 @@ class Learner(object):
             self.transitions[oldTile] = collections.Counter()
             self.transitions[oldTile][newTile] = 1
 
+    # Function: Merge
+    # ---------------
+    # Adds the transitions counted by another Learner (for instance one that
+    # watched other episodes in a worker process) to the counts of this one.
+    def merge(self, other):
+        for oldTile, counter in other.transitions.items():
+            if oldTile in self.transitions:
+                self.transitions[oldTile].update(counter)
+            else:
+                self.transitions[oldTile] = collections.Counter(counter)
+
     # Function: Save Transition Prob
     # ------------------------------
     # After the algorithm has finished running, saveTransitionProb is called.
     # Put any relevant data you have into the transProb dictionary and call
     # util.saveTransProb. You will be using this dictionary in your inference
-    # algorithms.
-    def saveTransitionProb(self, transFile):
+    # algorithms. Only the nonzero probabilities are kept; with a sparsePath
+    # they are also saved as a sparse matrix (see util.saveSparseTransProb).
+    def saveTransitionProb(self, transFile, sparsePath = None):
         transProb = {}
 
         # transProb is a dict {(oldTile, newTile) : prob}
@@ -51,9 +63,12 @@ class Learner(object):
             for key in counter:
                 counter[key] /= s
         for oldTile in self.transitions:
-            for newTile in self.transitions:
-                transProb[(oldTile, newTile)] = self.transitions[oldTile][newTile]
+            for newTile in self.transitions[oldTile]:
+                if newTile in self.transitions:
+                    transProb[(oldTile, newTile)] = self.transitions[oldTile][newTile]
 
         util.saveTransProb(
             transProb, transFile
         )  ### COMMENTED SO THAT WE DO NOT OVERRIDE ANY LEARNED PROBABILITIES
+        if sparsePath is not None:
+            util.saveSparseTransProb(transProb, sparsePath)
@@ -4,6 +4,9 @@
 from engine.const import Const
 import util, math, random, collections
 
+if util.NUMPY_ENABLED:
+    import numpy as np
+
 
 ############################################################
 # Problem 1: Warmup
@@ -118,15 +121,23 @@ class ExactInference(object):
     # Function: Init
     # --------------
     # Constructer that initializes an ExactInference object which has
-    # numRows x numCols number of tiles.
-    def __init__(self, numRows, numCols):
+    # numRows x numCols number of tiles. With useNumpy (which needs NumPy,
+    # see util.NUMPY_ENABLED) observe and elapseTime update every tile at
+    # once on a util.ArrayBelief.
+    def __init__(self, numRows, numCols, useNumpy = False):
         self.skipElapse = (
             False  ### ONLY USED BY GRADER.PY in case problem 3 has not been completed
         )
+        self.useNumpy = useNumpy
         # util.Belief is a class (constructor) that represents the belief for a single
         # inference state of a single car (see util.py).
-        self.belief = util.Belief(numRows, numCols)
+        if useNumpy:
+            self.belief = util.ArrayBelief(numRows, numCols)
+        else:
+            self.belief = util.Belief(numRows, numCols)
         self.transProb = util.loadTransProb()
+        if useNumpy:
+            self.initArrays()
 
     ############################################################
     # Problem 2:
@@ -147,6 +158,8 @@ class ExactInference(object):
     ############################################################
 
     def observe(self, agentX, agentY, observedDist):
+        if self.useNumpy:
+            return self.observeArray(agentX, agentY, observedDist)
         # BEGIN_YOUR_ANSWER (our solution is 9 lines of code, but don't worry if you deviate from this)
         numRows = self.belief.getNumRows()
         numCols = self.belief.getNumCols()
@@ -184,6 +197,8 @@ class ExactInference(object):
     def elapseTime(self):
         if self.skipElapse:
             return  ### ONLY FOR THE GRADER TO USE IN Problem 2
+        if self.useNumpy:
+            return self.elapseTimeArray()
         # BEGIN_YOUR_ANSWER (our solution is 8 lines of code, but don't worry if you deviate from this)
         numRows = self.belief.getNumRows()
         numCols = self.belief.getNumCols()
@@ -213,6 +228,47 @@ class ExactInference(object):
     def getBelief(self):
         return self.belief
 
+    # Function: Init Arrays
+    # ---------------------
+    # Precomputes the tile centers for observeArray and turns the sparse
+    # transition matrix (util.loadTransMatrix) into the three parallel arrays
+    # elapseTimeArray uses: the flat index of the old tile, the flat index
+    # of the new tile and the probability of every transition on the grid.
+    def initArrays(self):
+        numRows = self.belief.getNumRows()
+        numCols = self.belief.getNumCols()
+        self.tileX = (np.arange(numCols) + 0.5) * Const.BELIEF_TILE_SIZE
+        self.tileY = (np.arange(numRows) + 0.5) * Const.BELIEF_TILE_SIZE
+
+        tiles, indptr, indices, data = util.loadTransMatrix()
+        rows, cols = tiles[:, 0], tiles[:, 1]
+        onGrid = (rows >= 0) & (rows < numRows) & (cols >= 0) & (cols < numCols)
+        flat = rows.astype(np.intp) * numCols + cols
+        old = np.repeat(np.arange(len(tiles)), np.diff(indptr))
+        keep = onGrid[old] & onGrid[indices]
+        self.transOld = flat[old[keep]]
+        self.transNew = flat[indices[keep]]
+        self.transWeights = data[keep]
+
+    # Function: Observe Array
+    # -----------------------
+    # observe on every tile at once: the emission probabilities are a
+    # Gaussian over the distances from the agent to all tile centers.
+    def observeArray(self, agentX, agentY, observedDist):
+        dist = np.hypot(self.tileX[np.newaxis, :] - agentX, self.tileY[:, np.newaxis] - agentY)
+        self.belief.grid *= util.pdfArray(dist, Const.SONAR_STD, observedDist)
+        self.belief.normalize()
+
+    # Function: Elapse Time Array
+    # ---------------------------
+    # elapseTime as one sparse matrix-vector product: every transition moves
+    # its share of the old tile's belief to the new tile.
+    def elapseTimeArray(self):
+        grid = self.belief.grid
+        moved = grid.ravel()[self.transOld] * self.transWeights
+        self.belief.grid = np.bincount(self.transNew, weights = moved, minlength = grid.size).reshape(grid.shape)
+        self.belief.normalize()
+
 
 # Class: Particle Filter
 # ----------------------
@@ -225,8 +281,14 @@ class ParticleFilter(object):
     # Function: Init
     # --------------
     # Constructer that initializes an ParticleFilter object which has
-    # numRows x numCols number of tiles.
-    def __init__(self, numRows, numCols):
+    # numRows x numCols number of tiles. numParticles overrides
+    # NUM_PARTICLES. With aliasSampling the particles are drawn in batches
+    # from util.AliasSampler tables (built once per tile for the transitions)
+    # instead of one util.weightedRandomChoice scan per particle.
+    def __init__(self, numRows, numCols, numParticles = None, aliasSampling = False):
+        if numParticles is not None:
+            self.NUM_PARTICLES = numParticles
+        self.aliasSampling = aliasSampling
         self.belief = util.Belief(numRows, numCols)
 
         # Load the transition probabilities and store them in a dict of defaultdict
@@ -245,6 +307,14 @@ class ParticleFilter(object):
             particleIndex = int(random.random() * len(potentialParticles))
             self.particles[potentialParticles[particleIndex]] += 1
 
+        if aliasSampling:
+            # Seeded from the random module, so a fixed seed still fixes the run
+            self.rng = np.random.RandomState(random.getrandbits(32)) if util.NUMPY_ENABLED else None
+            self.transSamplers = dict()
+            for oldTile in self.transProbDict:
+                if any(prob > 0 for prob in self.transProbDict[oldTile].values()):
+                    self.transSamplers[oldTile] = util.AliasSampler(self.transProbDict[oldTile])
+
         self.updateBelief()
 
     # Function: Update Belief
@@ -289,6 +359,8 @@ class ParticleFilter(object):
     # - To pass the grader, you must call util.weightedRandomChoice() once per new particle.
     ############################################################
     def observe(self, agentX, agentY, observedDist):
+        if self.aliasSampling:
+            return self.observeAlias(agentX, agentY, observedDist)
         # BEGIN_YOUR_ANSWER (our solution is 12 lines of code, but don't worry if you deviate from this)
         
         # reweight
@@ -326,6 +398,8 @@ class ParticleFilter(object):
     #   and call util.weightedRandomChoice() $once per particle$ on the tile.
     ############################################################
     def elapseTime(self):
+        if self.aliasSampling:
+            return self.elapseTimeAlias()
         # BEGIN_YOUR_ANSWER (our solution is 7 lines of code, but don't worry if you deviate from this)
         newParticles = collections.defaultdict(int)
 
@@ -342,3 +416,131 @@ class ParticleFilter(object):
     # belief probabilities should sum to 1.
     def getBelief(self):
         return self.belief
+
+    # Function: Observe Alias
+    # -----------------------
+    # observe with the resampling done as one batch of NUM_PARTICLES draws
+    # from an alias table over the reweighted tiles.
+    def observeAlias(self, agentX, agentY, observedDist):
+        for tile in self.particles:
+            dist = math.sqrt(math.pow(agentX - util.colToX(tile[1]), 2) + math.pow(agentY - util.rowToY(tile[0]), 2))
+            self.particles[tile] = util.pdf(dist, Const.SONAR_STD, observedDist) * self.particles[tile]
+
+        self.particles = collections.defaultdict(int, util.AliasSampler(self.particles).sampleCounts(self.NUM_PARTICLES, self.rng))
+        self.updateBelief()
+
+    # Function: Elapse Time Alias
+    # ---------------------------
+    # elapseTime drawing all the particles of a tile in one batch from the
+    # tile's precomputed transition sampler.
+    def elapseTimeAlias(self):
+        newParticles = collections.defaultdict(int)
+
+        for tile in self.particles:
+            for newTile, count in self.transSamplers[tile].sampleCounts(self.particles[tile], self.rng).items():
+                newParticles[newTile] += count
+
+        self.particles = newParticles
+
+
+# Class: Vector Particle Filter
+# -----------------------------
+# A particle filter whose particles are a NumPy array of tile ids (rows of
+# the sparse transition matrix from util.loadTransMatrix), so every step
+# handles all the particles at once. Selected with
+# "drive.py -i vectorParticleFilter"; requires NumPy.
+class VectorParticleFilter(object):
+
+    NUM_PARTICLES = 10000
+
+    # Function: Init
+    # --------------
+    # Constructer that initializes a VectorParticleFilter object which has
+    # numRows x numCols number of tiles. Random numbers come from a NumPy
+    # generator seeded from the random module, so a fixed seed still fixes
+    # the run.
+    def __init__(self, numRows, numCols, numParticles = None):
+        if numParticles is not None:
+            self.NUM_PARTICLES = numParticles
+        self.numRows = numRows
+        self.numCols = numCols
+        self.rng = np.random.RandomState(random.getrandbits(32))
+
+        tiles, indptr, indices, data = util.loadTransMatrix()
+        self.tileRows = tiles[:, 0]
+        self.tileCols = tiles[:, 1]
+        self.tileX = (self.tileCols + 0.5) * Const.BELIEF_TILE_SIZE
+        self.tileY = (self.tileRows + 0.5) * Const.BELIEF_TILE_SIZE
+        self.onGrid = (self.tileRows >= 0) & (self.tileRows < numRows) & (self.tileCols >= 0) & (self.tileCols < numCols)
+
+        # Cumulative transition table: entry j of row t holds t plus the
+        # probability of moving to one of the first entries of the row up to
+        # j, so a single sorted search over all rows finds the new tile of a
+        # particle on tile t from t + u with u uniform in [0, 1).
+        self.indptr = indptr
+        self.indices = indices
+        rowCounts = np.diff(indptr)
+        rowIds = np.repeat(np.arange(len(tiles)), rowCounts)
+        rowTotals = np.bincount(rowIds, weights = data, minlength = len(tiles))
+        cumulative = np.cumsum(data)
+        rowStarts = np.concatenate(([0.0], cumulative))[indptr[:-1]]
+        self.transCdf = rowIds + (cumulative - rowStarts[rowIds]) / rowTotals[rowIds]
+        self.canMove = rowCounts > 0
+
+        # Initialize the particles uniformly over the tiles cars leave from
+        starts = np.flatnonzero(self.canMove)
+        self.particles = starts[self.rng.randint(len(starts), size = self.NUM_PARTICLES)]
+
+        self.updateBelief()
+
+    # Function: Update Belief
+    # ---------------------
+    # Updates |self.belief| with the fraction of the particles on each tile.
+    def updateBelief(self):
+        particles = self.particles[self.onGrid[self.particles]]
+        flat = self.tileRows[particles].astype(np.intp) * self.numCols + self.tileCols[particles]
+        counts = np.bincount(flat, minlength = self.numRows * self.numCols).astype(float)
+        newBelief = util.ArrayBelief(self.numRows, self.numCols, 0)
+        newBelief.grid = counts.reshape(self.numRows, self.numCols)
+        if counts.any():
+            newBelief.normalize()
+        self.belief = newBelief
+
+    # Function: Observe
+    # -----------------
+    # Reweights every particle by the emission probability of the observed
+    # distance and draws NUM_PARTICLES new ones by systematic resampling
+    # (one random offset, evenly spaced positions over the cumulative
+    # weights).
+    def observe(self, agentX, agentY, observedDist):
+        dist = np.hypot(self.tileX[self.particles] - agentX, self.tileY[self.particles] - agentY)
+        weights = util.pdfArray(dist, Const.SONAR_STD, observedDist)
+        total = weights.sum()
+        if total > 0: # otherwise the observation says nothing we can use
+            cumulative = np.cumsum(weights / total)
+            positions = (self.rng.random_sample() + np.arange(self.NUM_PARTICLES)) / self.NUM_PARTICLES
+            chosen = np.minimum(np.searchsorted(cumulative, positions, side = 'right'), len(self.particles) - 1)
+            self.particles = self.particles[chosen]
+        self.updateBelief()
+
+    # Function: Elapse Time
+    # ---------------------
+    # Moves every particle to a new tile drawn from the transition
+    # probabilities of its tile; particles on tiles cars never left stay.
+    def elapseTime(self):
+        particles = self.particles
+        moving = self.canMove[particles]
+        keys = particles[moving] + self.rng.random_sample(moving.sum())
+        entries = np.searchsorted(self.transCdf, keys, side = 'right')
+        # rounding may put a key past the last entry of its row
+        entries = np.minimum(entries, self.indptr[particles[moving] + 1] - 1)
+        particles = particles.copy()
+        particles[moving] = self.indices[entries]
+        self.particles = particles
+
+    # Function: Get Belief
+    # ---------------------
+    # Returns your belief of the probability that the car is in each tile. Your
+    # belief probabilities should sum to 1.
+    def getBelief(self):
+        return self.belief
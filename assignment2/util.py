@@ -9,12 +9,19 @@ In addition to the Belief class, this file contains the
 following helper methods:
  saveTransProb()
  loadTransProb()
+ saveSparseTransProb()
+ loadTransMatrix()
  xToCol(x)
  yToRow(y)
  colToX(col)
  rowToY(row)
  pdf(mean, std, value)
+ pdfArray(means, std, value)
  weightedRandomChoice(weightDict)
+
+the AliasSampler class for repeated draws from one distribution, and
+ArrayBelief, a Belief backed by a NumPy array. NumPy is optional:
+NUMPY_ENABLED tells whether the array helpers can be used.
  
 Licensing Information: Please do not distribute or publish solutions to this
 project. You are free to use and extend Driverless Car for educational
@@ -24,10 +31,17 @@ Chris Piech (piech@cs.stanford.edu). It was inspired by the Pacman projects.
 
 from engine.const import Const
 import pickle as pickle
+import hashlib
 import math
 import os.path
 import random
 
+try:
+    import numpy as np
+    NUMPY_ENABLED = True
+except ImportError:
+    NUMPY_ENABLED = False
+
 # Function: Save Trans Prob
 # -------------------------
 # Saves the transition probabilities that have been generated by running
@@ -37,16 +51,134 @@ import random
 def saveTransProb(transDict, transFile):
     pickle.dump(transDict, transFile)
 
+# Loaded transition probabilities, shared by every car of the process
+TRANS_PROB_CACHE = {}
+TRANS_MATRIX_CACHE = {}
+SPARSE_TRANS_PROB_CHECKS = {}
+
+# Function: Save Sparse Trans Prob
+# --------------------------------
+# Saves a transDict of the form {(oldTile, newTile) : prob} to the .npz file
+# transPath as a sparse (CSR) matrix over the tiles that occur in it. Only
+# the nonzero probabilities are stored, in the order of transDict:
+#  tiles:   (row, col) of every tile, in order of first appearance
+#  indptr:  the transitions out of tiles[i] are entries indptr[i]:indptr[i + 1]
+#  indices: index in tiles of the new tile of each entry
+#  data:    probability of each entry
+#  source:  transProbDigest of the pickle saveTransProb writes for transDict
+# Requires NumPy.
+def saveSparseTransProb(transDict, transPath):
+    tiles, indptr, indices, data = sparseTransMatrix(transDict)
+    source = transProbDigest(pickle.dumps(transDict))
+    np.savez_compressed(transPath, tiles = tiles, indptr = indptr, indices = indices, data = data, source = source)
+
+# Function: Trans Prob Digest
+# ---------------------------
+# Fingerprint of the bytes of a pickled transition probability file.
+def transProbDigest(pickled):
+    return hashlib.sha1(pickled).hexdigest()
+
+# Function: Sparse Trans Matrix
+# -----------------------------
+# Converts a transDict into the CSR arrays (tiles, indptr, indices, data)
+# described in saveSparseTransProb.
+def sparseTransMatrix(transDict):
+    # old tiles are numbered first, so that the rows keep the order of transDict
+    tileIds = {}
+    for (oldTile, newTile), prob in transDict.items():
+        if prob and oldTile not in tileIds:
+            tileIds[oldTile] = len(tileIds)
+    for (oldTile, newTile) in transDict:
+        for tile in (oldTile, newTile):
+            if tile not in tileIds:
+                tileIds[tile] = len(tileIds)
+    rows = {}
+    for (oldTile, newTile), prob in transDict.items():
+        if prob:
+            rows.setdefault(tileIds[oldTile], []).append((tileIds[newTile], prob))
+
+    tiles = np.zeros((len(tileIds), 2), dtype = np.int32)
+    for tile, i in tileIds.items():
+        tiles[i] = tile
+    indptr = np.zeros(len(tileIds) + 1, dtype = np.int64)
+    indices, data = [], []
+    for i in range(len(tileIds)):
+        for newId, prob in rows.get(i, []):
+            indices.append(newId)
+            data.append(prob)
+        indptr[i + 1] = len(indices)
+    return tiles, indptr, np.array(indices, dtype = np.int32), np.array(data, dtype = float)
+
+# Function: Trans Prob Paths
+# --------------------------
+# The pickled and the sparse transition probability files of the current world.
+def transProbPaths():
+    base = os.path.join('learned', Const.WORLD + 'TransProb')
+    return base + '.p', base + '.npz'
+
+# Function: Has Sparse Trans Prob
+# -------------------------------
+# True when the .npz file exists and was saved from the pickle that is there
+# now (its source matches the digest of the .p file), so that a pickle
+# regenerated or replaced without the .npz is not shadowed by stale data.
+# Checked once per process. Requires NumPy.
+def hasSparseTransProb():
+    transFilePath, sparsePath = transProbPaths()
+    if sparsePath not in SPARSE_TRANS_PROB_CHECKS:
+        current = os.path.exists(sparsePath)
+        if current and os.path.exists(transFilePath):
+            with np.load(sparsePath) as arrays:
+                source = str(arrays['source']) if 'source' in arrays.files else None
+            with open(transFilePath, 'rb') as transFile:
+                current = source == transProbDigest(transFile.read())
+        SPARSE_TRANS_PROB_CHECKS[sparsePath] = current
+    return SPARSE_TRANS_PROB_CHECKS[sparsePath]
+
 # Function: Load Trans Prob
 # -------------------------
 # Loads the transition probabilities that have been generated by running
-# "learner." 
+# "learner." Reads the sparse .npz file when there is one saved from the
+# current pickle (and NumPy is available), the pickle otherwise. Files are
+# read once per process: every call returns the same dict, which must not
+# be modified.
 def loadTransProb():
-    transFileName = Const.WORLD + 'TransProb.p'
-    transFilePath = os.path.join('learned', transFileName)
-    with open(transFilePath, 'rb') as transFile:
-        return pickle.load(transFile)
-    raise Exception('could not load ' + transFilePath + '. Did you run learner on this layout?')
+    transFilePath, sparsePath = transProbPaths()
+    if NUMPY_ENABLED and hasSparseTransProb():
+        if sparsePath not in TRANS_PROB_CACHE:
+            tiles, indptr, indices, data = loadTransMatrix()
+            tiles = [tuple(tile) for tile in tiles.tolist()]
+            transProb = {}
+            for i, oldTile in enumerate(tiles):
+                for j in range(indptr[i], indptr[i + 1]):
+                    transProb[(oldTile, tiles[indices[j]])] = float(data[j])
+            TRANS_PROB_CACHE[sparsePath] = transProb
+        return TRANS_PROB_CACHE[sparsePath]
+
+    if transFilePath not in TRANS_PROB_CACHE:
+        if not os.path.exists(transFilePath):
+            raise Exception('could not load ' + transFilePath + '. Did you run learner on this layout?')
+        with open(transFilePath, 'rb') as transFile:
+            TRANS_PROB_CACHE[transFilePath] = pickle.load(transFile)
+    return TRANS_PROB_CACHE[transFilePath]
+
+# Function: Load Trans Matrix
+# ---------------------------
+# Returns the transition probabilities as the NumPy CSR arrays
+# (tiles, indptr, indices, data) described in saveSparseTransProb, from the
+# .npz file when it matches the pickle or else converted from the pickle.
+# Cached like loadTransProb; the arrays must not be modified. Requires NumPy.
+def loadTransMatrix():
+    transFilePath, sparsePath = transProbPaths()
+    if sparsePath not in TRANS_MATRIX_CACHE:
+        if hasSparseTransProb():
+            with np.load(sparsePath) as arrays:
+                matrix = tuple(arrays[name] for name in ('tiles', 'indptr', 'indices', 'data'))
+        else:
+            matrix = sparseTransMatrix(loadTransProb())
+        for array in matrix:
+            array.setflags(write = False)
+        TRANS_MATRIX_CACHE[sparsePath] = matrix
+    return TRANS_MATRIX_CACHE[sparsePath]
 
 # Function: X to Col
 # -------------------------
@@ -90,6 +222,16 @@ def pdf(mean, std, value):
     y = (1.0 / (math.sqrt(2 * math.pi) * std)) * math.exp(-u * u / 2.0)
     return y
 
+# Function: Pdf Array
+# -------------------------
+# Vectorized pdf: returns the Gaussian densities of distributions with the
+# means in the NumPy array |means| (any shape) and a shared std producing
+# value. Requires NumPy.
+def pdfArray(means, std, value):
+    assert std > 0
+    u = (value - means) / float(std)
+    return (1.0 / (math.sqrt(2 * math.pi) * std)) * np.exp(-u * u / 2.0)
+
 # Function: Weighted Random Choice
 # --------------------------------
 # Given a dictionary of the form element -> weight, selects an element
@@ -113,6 +255,80 @@ def weightedRandomChoice(weightDict):
             return elems[chosenIndex]
     raise Exception('Should not reach here')
 
+# Class: Alias Sampler
+# ---------------------
+# Draws elements of a dictionary element -> weight like weightedRandomChoice,
+# but in O(1) per draw after an O(n) setup (Vose's alias method), for
+# distributions that are sampled many times. Elements with zero weight are
+# never drawn.
+class AliasSampler(object):
+
+    def __init__(self, weightDict):
+        self.elems = [elem for elem in weightDict if weightDict[elem] > 0]
+        n = len(self.elems)
+        if n == 0:
+            raise Exception('Cannot sample from a distribution without positive weights')
+        total = float(sum(weightDict[elem] for elem in self.elems))
+        scaled = [weightDict[elem] * n / total for elem in self.elems]
+
+        # every column i keeps element i with probability prob[i], else alias[i]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        if NUMPY_ENABLED:
+            self.probArray = np.array(self.prob)
+            self.aliasArray = np.array(self.alias)
+
+    # Function: Sample
+    # ----------------
+    # Returns one element drawn from the distribution.
+    def sample(self):
+        u = random.random() * len(self.elems)
+        i = int(u)
+        if u - i < self.prob[i]:
+            return self.elems[i]
+        return self.elems[self.alias[i]]
+
+    # Function: Sample Counts
+    # -----------------------
+    # Draws k elements at once and returns how often each one was drawn, as a
+    # dictionary element -> count. With NumPy the k columns and coin flips are
+    # drawn as two arrays from rng (a NumPy RandomState, np.random by default)
+    # and counted with bincount; without it they come from the random module.
+    def sampleCounts(self, k, rng = None):
+        elems = self.elems
+        n = len(elems)
+        if NUMPY_ENABLED:
+            if rng is None:
+                rng = np.random
+            columns = rng.randint(n, size = k)
+            kept = rng.random_sample(k) < self.probArray[columns]
+            drawn = np.where(kept, columns, self.aliasArray[columns])
+            counts = np.bincount(drawn, minlength = n).tolist()
+        else:
+            prob, alias = self.prob, self.alias
+            counts = [0] * n
+            rand = random.random
+            for _ in range(k):
+                u = rand() * n
+                i = int(u)
+                if u - i < prob[i]:
+                    counts[i] += 1
+                else:
+                    counts[alias[i]] += 1
+        return dict((elems[i], counts[i]) for i in range(n) if counts[i])
+
 # Class: Belief
 # ----------------
 # This class represents the belief for a single inference state of a single 
@@ -187,3 +403,33 @@ class Belief(object):
             for c in range(self.numCols):
                 total += self.getProb(r, c)
         return total
+
+# Class: Array Belief
+# ----------------
+# A Belief stored as a numRows by numCols NumPy float array, so inference
+# code can update every tile at once through |grid|. The Belief methods
+# still work tile by tile. Requires NumPy.
+class ArrayBelief(Belief):
+
+    def __init__(self, numRows, numCols, value = None):
+        self.numRows = numRows
+        self.numCols = numCols
+        if value == None:
+            value = (1.0 / (numRows * numCols))
+        self.grid = np.full((numRows, numCols), value, dtype = float)
+
+    def setProb(self, row, col, p):
+        self.grid[row, col] = p
+
+    def addProb(self, row, col, delta):
+        self.grid[row, col] += delta
+        assert self.grid[row, col] >= 0.0
+
+    def getProb(self, row, col):
+        return float(self.grid[row, col])
+
+    def normalize(self):
+        self.grid /= self.grid.sum()
+
+    def getSum(self):
+        return float(self.grid.sum())
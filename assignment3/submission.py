@@ -3,7 +3,10 @@
 import random
 import collections
 import math
+import os
 import sys
+import tempfile
+import warnings
 from collections import Counter
 from util import *
 
@@ -57,7 +60,7 @@ def extractWordFeatures(x):
 # Problem 2b: stochastic gradient descent
 
 
-def learnPredictor(trainExamples, testExamples, featureExtractor, numIters, eta):
+def learnPredictor(trainExamples, testExamples, featureExtractor, numIters, eta, numWorkers=1, parallelMode="serial"):
     """
     Given |trainExamples| and |testExamples| (each one is a list of (x,y)
     pairs), a |featureExtractor| to apply to x, and the number of iterations to
@@ -72,35 +75,134 @@ def learnPredictor(trainExamples, testExamples, featureExtractor, numIters, eta)
     to see how you're doing as you learn after each iteration.
     2. don't shuffle trainExamples and use them in the original order to update weights.
     3. don't use any mini-batch whose size is more than 1
+
+    |parallelMode| is one of PARALLEL_MODES. The default "serial" runs
+    the single ordered pass on one process, and it is the only mode that
+    gives the weights described above. "hogwild" and "average" run the
+    epochs on |numWorkers| processes with sgdParallel and need NumPy.
+    Their weights differ from the serial ones, and hogwild's also differ
+    from run to run. |numWorkers| > 1 is ignored with a warning when the
+    mode is "serial" or NumPy is missing.
     """
     weights = {}  # feature => weight
 
-    def sigmoid(n):
-        return 1 / (1 + math.exp(-n))
-
     # BEGIN_YOUR_ANSWER (our solution is 14 lines of code, but don't worry if you deviate from this)
+    checkParallelMode(parallelMode)
+    if numWorkers > 1 and parallelMode == "serial":
+        warnings.warn("numWorkers=%d ignored: parallelMode is \"serial\"" % numWorkers)
+    elif parallelMode != "serial" and not NUMPY_ENABLED:
+        warnings.warn("parallelMode %r needs NumPy, training serially" % parallelMode)
+
+    # Featurize every example once, with interned feature ids
+    if isinstance(featureExtractor, Featurizer):
+        featurizer = featureExtractor
+    else:
+        featurizer = Featurizer(featureExtractor)
+    if NUMPY_ENABLED:
+        predictor = LinearPredictor(featurizer, None)
+        matrix = predictor.matrix(trainExamples)
+        if testExamples:
+            predictor.matrix(testExamples)
+        weightArray = np.zeros(len(featurizer.features))
+
+        def reportErrors(weightArray):
+            if testExamples:
+                predictor.weights = weightArray
+                trainError = evaluatePredictor(trainExamples, predictor)
+                testError = evaluatePredictor(testExamples, predictor)
+                print("train error: ", trainError, "test error: ", testError)
+
+        if parallelMode != "serial":
+            weightArray = sgdParallel(
+                matrix, len(weightArray), numIters, eta, numWorkers, parallelMode, reportErrors
+            )
+        else:
+            for _ in range(numIters):
+                sgdEpoch(matrix, weightArray, eta)
+                reportErrors(weightArray)
+        trained = np.unique(matrix.indices).tolist()
+        return {featurizer.features[i]: float(weightArray[i]) for i in trained}
+
+    phis = featurizer.featurize_many([x for x, y in trainExamples])
+    weightList = [0.0] * len(featurizer.features)
+    predictor = LinearPredictor(featurizer, weightList)
+
     for _ in range(numIters):
-        for data in trainExamples:
-            features = featureExtractor(data[0])
-            answer = data[1]
-            weightedResult = dotProduct(features, weights)
-
-            # calculate loss
-            loss = {}
-            for feature, value in features.items():
-                loss[feature] = ((sigmoid(weightedResult) * math.exp(-1 * weightedResult) * -1) if (answer == 1) else sigmoid(weightedResult)) * value
-
-            # update weight
-            for feature, value in loss.items():
-                weights[feature] = (weights[feature] if (feature in weights) else 0) - (eta * value) 
-        
-        # trainError = evaluatePredictor(trainExamples, lambda x: (1 if dotProduct(featureExtractor(x), weights) >= 0 else -1))
-        # testError = evaluatePredictor(testExamples, lambda x: (1 if dotProduct(featureExtractor(x), weights) >= 0 else -1))
-        # print("train error: ", trainError, "test error: ", testError)
+        for (ids, values), (x, y) in zip(phis, trainExamples):
+            margin = sum(weightList[i] * v for i, v in zip(ids, values))
+            scale = -eta * logisticGradient(margin, y)
+            for i, v in zip(ids, values):
+                weightList[i] += v * scale
+
+        if testExamples:
+            trainError = evaluatePredictor(trainExamples, predictor)
+            testError = evaluatePredictor(testExamples, predictor)
+            print("train error: ", trainError, "test error: ", testError)
+    trained = sorted(set(i for ids, values in phis for i in ids))
+    weights = {featurizer.features[i]: weightList[i] for i in trained}
     # END_YOUR_ANSWER
     return weights
 
 
+def learnPredictorStreaming(trainPath, featureExtractor, numIters, eta, chunkSize=10000, cacheDir=None):
+    """
+    Same training as learnPredictor, but the examples are read from
+    |trainPath| |chunkSize| at a time. Each chunk is featurized once, during
+    the first pass, and saved under |cacheDir| (a temporary directory by
+    default); the later passes map the saved chunks back from disk, so only
+    one chunk of features is in memory at a time. Requires NumPy.
+    """
+    tempDir = None
+    if cacheDir is None:
+        tempDir = tempfile.TemporaryDirectory()
+        cacheDir = tempDir.name
+    featureIds = {}
+    weightArray = np.zeros(0)
+    chunkPrefixes = []
+    try:
+        for chunk in readExampleChunks(trainPath, chunkSize):
+            matrix = featurizeExamples(chunk, featureExtractor, featureIds)
+            if len(featureIds) > len(weightArray):
+                grown = np.zeros(max(len(featureIds), 2 * len(weightArray)))
+                grown[: len(weightArray)] = weightArray
+                weightArray = grown
+            prefix = os.path.join(cacheDir, "chunk%d" % len(chunkPrefixes))
+            matrix.save(prefix)
+            chunkPrefixes.append(prefix)
+            if numIters > 0:
+                sgdEpoch(matrix, weightArray, eta)
+        for _ in range(numIters - 1):
+            for prefix in chunkPrefixes:
+                sgdEpoch(FeatureMatrix.load(prefix), weightArray, eta)
+    finally:
+        if tempDir is not None:
+            tempDir.cleanup()
+    return dict(zip(featureIds, weightArray.tolist()))
+
+
+def learnHashedPredictor(trainExamples, featureExtractor, numIters, eta, numBits=18):
+    """
+    Same training as learnPredictor, but in the hashed feature space of a
+    FeatureHasher with 2^|numBits| buckets. Returns the hasher and the flat
+    weight vector; score an x with
+    hashedDotProduct(hasher.hashFeatures(featureExtractor(x)), weights).
+    """
+    hasher = FeatureHasher(numBits)
+    extract = hasher.extractor(featureExtractor)
+    weights = hasher.newWeights()
+    if NUMPY_ENABLED:
+        matrix = featurizeExamples(trainExamples, extract)
+        for _ in range(numIters):
+            sgdEpoch(matrix, weights, eta)
+        return hasher, weights
+
+    features = [(extract(x), y) for x, y in trainExamples]
+    for _ in range(numIters):
+        for phi, y in features:
+            hashedIncrement(weights, -eta * logisticGradient(hashedDotProduct(phi, weights), y), phi)
+    return hasher, weights
+
+
 ############################################################
 # Problem 2c: bigram features
 
@@ -115,19 +217,14 @@ def extractBigramFeatures(x):
     """
     # BEGIN_YOUR_ANSWER (our solution is 5 lines of code, but don't worry if you deviate from this)
     phi = extractWordFeatures(x)
-    prev = "<s>"
-    features = x.split(' ')
+    tokens = x.split(' ')
 
-    for feature in features:
-        bigram = (prev, feature)
-        
+    for bigram in zip(["<s>"] + tokens, tokens):
         if bigram in phi:
             phi[bigram] += 1
         else:
             phi[bigram] = 1
-        
-        prev = feature
 
-    phi[(prev, "</s>")] = 1
+    phi[(tokens[-1], "</s>")] = 1
     # END_YOUR_ANSWER
     return phi
@@ -1,5 +1,13 @@
-import os, random, operator, sys
-from collections import Counter
+import os, random, operator, sys, math, warnings, zlib
+from array import array
+from collections import Counter, OrderedDict
+
+try:
+    import numpy as np
+
+    NUMPY_ENABLED = True
+except ImportError:
+    NUMPY_ENABLED = False
 
 
 def dotProduct(d1, d2):
@@ -38,12 +46,452 @@ def readExamples(path):
     return examples
 
 
+def readExampleChunks(path, chunkSize):
+    """
+    Reads the examples of |path| lazily, |chunkSize| (x, y) pairs at a time,
+    so corpora that do not fit in memory can be streamed.
+    """
+    chunk = []
+    with open(path, encoding="ISO-8859-1") as f:
+        for line in f:
+            y, x = line.split(" ", 1)
+            chunk.append((x.strip(), int(y)))
+            if len(chunk) == chunkSize:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def sigmoid(z):
+    """
+    The logistic function, computed without overflowing math.exp for large |z|.
+    """
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    e = math.exp(z)
+    return e / (1.0 + e)
+
+
+def logisticGradient(margin, y):
+    """
+    Derivative of the logistic loss log(1 + exp(-y * margin)) with respect to
+    the margin: -y * sigmoid(-y * margin).
+    """
+    return -y * sigmoid(-y * margin)
+
+
+class FeatureMatrix:
+    """
+    A featurized set of examples in compressed sparse row form: the features
+    of row i are indices[indptr[i]:indptr[i + 1]] (int32 feature ids) with
+    values at the same positions (float32), and labels[i] is its y. Feature
+    ids are handed out by the |featureIds| dict passed to featurizeExamples,
+    so matrices built from several chunks of a corpus share one feature space.
+    Requires NumPy.
+    """
+
+    def __init__(self, indptr, indices, values, labels):
+        self.indptr = indptr
+        self.indices = indices
+        self.values = values
+        self.labels = labels
+
+    def numRows(self):
+        return len(self.labels)
+
+    def rows(self, start, end):
+        """
+        @return FeatureMatrix: rows start to end - 1, in order.
+        """
+        first, last = self.indptr[start], self.indptr[end]
+        return FeatureMatrix(
+            self.indptr[start : end + 1] - first,
+            self.indices[first:last],
+            self.values[first:last],
+            self.labels[start:end],
+        )
+
+    def save(self, prefix):
+        """
+        Writes the arrays to |prefix|.<name>.npy, which load() can map back
+        into memory without reading them.
+        """
+        for name in ("indptr", "indices", "values", "labels"):
+            np.save("%s.%s.npy" % (prefix, name), getattr(self, name))
+
+    @staticmethod
+    def load(prefix, mmap=True):
+        mode = "r" if mmap else None
+        arrays = [
+            np.load("%s.%s.npy" % (prefix, name), mmap_mode=mode)
+            for name in ("indptr", "indices", "values", "labels")
+        ]
+        return FeatureMatrix(*arrays)
+
+
+def featurizeExamples(examples, featureExtractor, featureIds=None):
+    """
+    Runs |featureExtractor| once over |examples| and packs the feature vectors
+    into a FeatureMatrix. New features are given the next free id in the
+    |featureIds| dict (feature => id), which is updated in place. Without
+    |featureIds| the features must already be int ids (e.g. hashed buckets).
+    """
+    indptr = [0]
+    indices = []
+    values = []
+    labels = []
+    for x, y in examples:
+        phi = featureExtractor(x)
+        if featureIds is None:
+            indices.extend(phi.keys())
+            values.extend(phi.values())
+        else:
+            for f, v in phi.items():
+                i = featureIds.get(f)
+                if i is None:
+                    i = featureIds[f] = len(featureIds)
+                indices.append(i)
+                values.append(v)
+        indptr.append(len(indices))
+        labels.append(y)
+    return FeatureMatrix(
+        np.array(indptr, dtype=np.int64),
+        np.array(indices, dtype=np.int32),
+        np.array(values, dtype=np.float32),
+        np.array(labels, dtype=np.int8),
+    )
+
+
+def sgdEpoch(matrix, weights, eta):
+    """
+    One pass of stochastic gradient descent on the logistic loss over the rows
+    of |matrix|, in order, updating the NumPy array |weights| (indexed by
+    feature id) in place.
+    """
+    indptr = matrix.indptr.tolist()
+    labels = matrix.labels.tolist()
+    indices = matrix.indices
+    values = matrix.values.astype(np.float64)
+    for row, y in enumerate(labels):
+        start, end = indptr[row], indptr[row + 1]
+        ids = indices[start:end]
+        phi = values[start:end]
+        margin = float(np.dot(weights[ids], phi))
+        weights[ids] -= (eta * logisticGradient(margin, y)) * phi
+
+
+# Set in each worker process by initParallelWorker
+WORKER_WEIGHTS = None
+WORKER_SHARDS = None
+
+
+def initParallelWorker(sharedWeights, shards):
+    global WORKER_WEIGHTS, WORKER_SHARDS
+    WORKER_WEIGHTS = np.frombuffer(sharedWeights)
+    WORKER_SHARDS = shards
+
+
+def hogwildEpoch(job):
+    """
+    One SGD pass over a shard, updating the shared weights in place without
+    any locking (Hogwild).
+    """
+    shard, eta = job
+    sgdEpoch(WORKER_SHARDS[shard], WORKER_WEIGHTS, eta)
+
+
+def averagedEpoch(job):
+    """
+    One SGD pass over a shard, starting from the shared weights, on a private
+    copy that is returned for averaging.
+    """
+    shard, eta = job
+    weights = WORKER_WEIGHTS.copy()
+    sgdEpoch(WORKER_SHARDS[shard], weights, eta)
+    return weights
+
+
+# The training modes of learnPredictor; all but "serial" run sgdParallel
+PARALLEL_MODES = ("serial", "hogwild", "average")
+
+
+def checkParallelMode(mode, modes=PARALLEL_MODES):
+    if mode not in modes:
+        raise ValueError("unknown parallel mode %r, expected one of: %s" % (mode, ", ".join(modes)))
+
+
+def sgdParallel(matrix, numFeatures, numIters, eta, numWorkers, mode="hogwild", onEpoch=None):
+    """
+    SGD over |matrix| on |numWorkers| processes, each running over one
+    contiguous shard of the rows (in their original order) per epoch:
+    - "hogwild": all workers update one shared-memory weight array at the
+      same time, without locks. Fastest, but the result depends on timing.
+    - "average": every worker trains its own copy from the weights of the
+      last epoch and the copies are averaged in shard order. The result is
+      the same on every run.
+    Neither mode reproduces the weights of the serial pass (sgdEpoch over
+    all the rows in order); only that pass does.
+    |onEpoch|(weights) is called after every epoch. Requires NumPy.
+    @return array: the weights, indexed by feature id.
+    """
+    import multiprocessing
+
+    checkParallelMode(mode, PARALLEL_MODES[1:])
+    bounds = [matrix.numRows() * i // numWorkers for i in range(numWorkers + 1)]
+    shards = [matrix.rows(start, end) for start, end in zip(bounds, bounds[1:])]
+    sharedWeights = multiprocessing.RawArray("d", numFeatures)
+    weights = np.frombuffer(sharedWeights)
+    jobs = [(shard, eta) for shard in range(numWorkers)]
+    pool = multiprocessing.Pool(numWorkers, initParallelWorker, (sharedWeights, shards))
+    try:
+        for _ in range(numIters):
+            if mode == "hogwild":
+                pool.map(hogwildEpoch, jobs)
+            else:
+                weights[:] = np.mean(pool.map(averagedEpoch, jobs), axis=0)
+            if onEpoch is not None:
+                onEpoch(weights)
+    finally:
+        pool.close()
+        pool.join()
+    return weights.copy()
+
+
+class Featurizer:
+    """
+    Wraps a feature extractor so that each text is featurized once. Features
+    are interned to int ids (|featureIds| feature => id, |features| id =>
+    feature) and the featurized texts are kept as compact (ids, values)
+    arrays in an LRU cache of at most |maxCacheBytes|. A Featurizer can be
+    called like the extractor it wraps, so it can be passed anywhere a
+    featureExtractor is expected.
+    """
+
+    def __init__(self, featureExtractor, maxCacheBytes=256 * 1024 * 1024):
+        self.featureExtractor = featureExtractor
+        self.maxCacheBytes = maxCacheBytes
+        self.featureIds = {}
+        self.features = []
+        self.cache = OrderedDict()  # x => (ids, values)
+        self.cacheBytes = 0
+
+    def featurize(self, x):
+        """
+        @return (array, tuple): the feature ids of |x| and their values.
+        """
+        entry = self.cache.get(x)
+        if entry is not None:
+            self.cache.move_to_end(x)
+            return entry
+        phi = self.featureExtractor(x)
+        ids = array("i")
+        for f in phi:
+            i = self.featureIds.get(f)
+            if i is None:
+                i = self.featureIds[f] = len(self.features)
+                self.features.append(f)
+            ids.append(i)
+        entry = (ids, tuple(phi.values()))
+        self.cache[x] = entry
+        self.cacheBytes += self.entryBytes(x, entry)
+        while self.cacheBytes > self.maxCacheBytes and len(self.cache) > 1:
+            oldX, oldEntry = self.cache.popitem(last=False)
+            self.cacheBytes -= self.entryBytes(oldX, oldEntry)
+        return entry
+
+    @staticmethod
+    def entryBytes(x, entry):
+        return sys.getsizeof(x) + sys.getsizeof(entry[0]) + sys.getsizeof(entry[1])
+
+    def featurize_many(self, texts):
+        """
+        @return list: featurize(x) for every x in |texts|.
+        """
+        return [self.featurize(x) for x in texts]
+
+    def asDict(self, entry):
+        """
+        @return dict: the feature vector (feature => value) of a featurized
+        (ids, values) entry.
+        """
+        features = self.features
+        return {features[i]: v for i, v in zip(*entry)}
+
+    def __call__(self, x):
+        return self.asDict(self.featurize(x))
+
+    def weightVector(self, weights):
+        """
+        The weights |weights| (feature => weight) as a NumPy array indexed
+        by feature id, for evaluateMatrix.
+        """
+        return np.array([weights.get(f, 0.0) for f in self.features])
+
+    def matrix(self, examples):
+        """
+        The FeatureMatrix of |examples| (a list of (x, y) pairs), with the
+        interned feature ids. Requires NumPy.
+        """
+        indptr = [0]
+        indices = []
+        values = []
+        for ids, phi in self.featurize_many([x for x, y in examples]):
+            indices.extend(ids)
+            values.extend(phi)
+            indptr.append(len(indices))
+        return FeatureMatrix(
+            np.array(indptr, dtype=np.int64),
+            np.array(indices, dtype=np.int32),
+            np.array(values, dtype=np.float32),
+            np.array([y for x, y in examples], dtype=np.int8),
+        )
+
+
+class LinearPredictor:
+    """
+    Predicts sign(w . phi(x)) with the features of a Featurizer and a weight
+    vector |weights| indexed by their ids (a NumPy array, or a list without
+    NumPy); ids past its end count as weight 0. evaluatePredictor scores a
+    whole list of examples through errorRate, which with NumPy is a single
+    evaluateMatrix call on the cached FeatureMatrix of the list.
+    """
+
+    def __init__(self, featurizer, weights):
+        self.featurizer = featurizer
+        self.weights = weights
+        self.matrices = {}  # id(examples) => (examples, FeatureMatrix)
+
+    def margin(self, ids, values):
+        weights = self.weights
+        n = len(weights)
+        return sum(weights[i] * v for i, v in zip(ids, values) if i < n)
+
+    def __call__(self, x):
+        return 1 if self.margin(*self.featurizer.featurize(x)) >= 0 else -1
+
+    def matrix(self, examples):
+        """
+        The FeatureMatrix of |examples|, built once per list. Requires NumPy.
+        """
+        entry = self.matrices.get(id(examples))
+        if entry is None or entry[0] is not examples:
+            entry = self.matrices[id(examples)] = (examples, self.featurizer.matrix(examples))
+        return entry[1]
+
+    def errorRate(self, examples):
+        """
+        @return float: the fraction of |examples| that are misclassified.
+        """
+        if NUMPY_ENABLED:
+            return evaluateMatrix(self.matrix(examples), np.asarray(self.weights))[0]
+        entries = self.featurizer.featurize_many([x for x, y in examples])
+        errors = sum(
+            1 for (ids, values), (x, y) in zip(entries, examples) if (1 if self.margin(ids, values) >= 0 else -1) != y
+        )
+        return 1.0 * errors / len(examples)
+
+
+class FeatureHasher:
+    """
+    The hashing trick: every feature (a word, a bigram tuple, ...) is mapped
+    to one of 2^numBits buckets with a sign of +1 or -1, both taken from a
+    CRC-32 of the feature, so the weights fit in a flat array of fixed size
+    however large the vocabulary is. The signs make colliding features cancel
+    out on average instead of adding up.
+    """
+
+    def __init__(self, numBits=18):
+        assert 0 < numBits <= 30
+        self.numBits = numBits
+        self.size = 1 << numBits
+        self.mask = self.size - 1
+
+    def bucket(self, f):
+        """
+        @return (int, int): the bucket and the sign of feature |f|.
+        """
+        key = "\0".join(f) if isinstance(f, tuple) else str(f)
+        h = zlib.crc32(key.encode("utf-8"))
+        return h & self.mask, (1 if h >> 31 else -1)
+
+    def hashFeatures(self, phi):
+        """
+        @param dict phi: a feature vector.
+        @return dict: the same vector in bucket space (bucket => signed value).
+        """
+        hashed = {}
+        for f, v in phi.items():
+            i, sign = self.bucket(f)
+            hashed[i] = hashed.get(i, 0) + sign * v
+        return hashed
+
+    def extractor(self, featureExtractor):
+        """
+        Wraps |featureExtractor| into one that returns hashed feature vectors.
+        """
+        return lambda x: self.hashFeatures(featureExtractor(x))
+
+    def newWeights(self):
+        """
+        A zero weight vector for the buckets: a NumPy array when available,
+        a list of floats otherwise.
+        """
+        if NUMPY_ENABLED:
+            return np.zeros(self.size)
+        return [0.0] * self.size
+
+
+def hashedDotProduct(phi, weights):
+    """
+    dotProduct for a hashed feature vector |phi| and a flat |weights| array.
+    """
+    return sum(weights[i] * v for i, v in phi.items())
+
+
+def hashedIncrement(weights, scale, phi):
+    """
+    Implements weights += scale * phi for a flat |weights| array and a hashed
+    feature vector |phi|.
+    """
+    for i, v in phi.items():
+        weights[i] += v * scale
+
+
+def evaluateMatrix(matrix, weights):
+    """
+    Scores every row of the FeatureMatrix |matrix| at once with the NumPy
+    weight array |weights| (indexed by feature id; ids past its end count as
+    weight 0) and predicts 1 when the margin is >= 0, else -1.
+    @return (float, Counter, array): the error rate, the confusion counts
+    (truth, prediction) => count and the margin of every row.
+    """
+    numRows = matrix.numRows()
+    ids = matrix.indices
+    known = ids < len(weights)
+    products = np.where(known, weights[np.where(known, ids, 0)], 0.0) * matrix.values
+    rows = np.repeat(np.arange(numRows), np.diff(matrix.indptr))
+    margins = np.bincount(rows, weights=products, minlength=numRows)
+    predictions = np.where(margins >= 0, 1, -1)
+    labels = matrix.labels.astype(np.int64)
+    confusion = Counter()
+    for truth in (1, -1):
+        for prediction in (1, -1):
+            count = int(np.count_nonzero((labels == truth) & (predictions == prediction)))
+            if count:
+                confusion[(truth, prediction)] = count
+    errorRate = float(np.count_nonzero(predictions != labels)) / max(numRows, 1)
+    return errorRate, confusion, margins
+
+
 def evaluatePredictor(examples, predictor):
     """
     predictor: a function that takes an x and returns a predicted y.
     Given a list of examples (x, y), makes predictions based on |predict| and returns the fraction
     of misclassiied examples.
     """
+    if isinstance(predictor, LinearPredictor):
+        return predictor.errorRate(examples)
     error = 0
     for x, y in examples:
         if predictor(x) != y:
@@ -77,10 +525,15 @@ def verbosePredict(phi, y, weights, out):
 
 
 def outputErrorAnalysis(examples, featureExtractor, weights, path):
+    if hasattr(featureExtractor, "featurize_many"):
+        entries = featureExtractor.featurize_many([x for x, y in examples])
+        phis = map(featureExtractor.asDict, entries)
+    else:
+        phis = (featureExtractor(x) for x, y in examples)
     out = open(path, "w", encoding="utf-8")
-    for x, y in examples:
+    for (x, y), phi in zip(examples, phis):
         print("===", x, file=out)
-        verbosePredict(featureExtractor(x), y, weights, out)
+        verbosePredict(phi, y, weights, out)
     out.close()
 
 